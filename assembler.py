@@ -0,0 +1,107 @@
+import os
+import re
+import subprocess
+import tempfile
+
+# =========================
+# FINAL VIDEO ASSEMBLY
+# =========================
+# Leonardo clips from one run normally share codec, resolution and frame
+# rate, so they can be joined with ffmpeg's concat demuxer and `-c copy`
+# (a remux, no re-encode). Only when the clips differ do we fall back to
+# a full moviepy re-render.
+
+_VIDEO_RE = re.compile(r"Stream #\d+:\d+.*?: Video: (\w+).*?, (\w+)(?:\(.*?\))?, (\d+)x(\d+)")
+_FPS_RE = re.compile(r"([\d.]+) (?:fps|tbr)")
+_AUDIO_RE = re.compile(r"Stream #\d+:\d+.*?: Audio: (\w+).*?, (\d+) Hz")
+
+
+def _ffmpeg():
+    # imageio-ffmpeg ships with moviepy and bundles a static binary
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+def probe_signature(path: str):
+    """(video codec, pixel format, width, height, fps, audio codec, sample rate)"""
+    result = subprocess.run(
+        [_ffmpeg(), "-hide_banner", "-i", path],
+        capture_output=True,
+        text=True
+    )
+    info = result.stderr
+
+    video = _VIDEO_RE.search(info)
+    if not video:
+        raise RuntimeError(f"❌ No video stream found in {path}")
+
+    line = info[video.start():info.find("\n", video.start())]
+    fps = _FPS_RE.search(line)
+    audio = _AUDIO_RE.search(info)
+
+    return (
+        video.group(1), video.group(2),
+        int(video.group(3)), int(video.group(4)),
+        fps.group(1) if fps else None,
+        audio.group(1) if audio else None,
+        audio.group(2) if audio else None,
+    )
+
+
+def _concat_copy(paths, output: str):
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", r"'\''")
+            f.write(f"file '{escaped}'\n")
+        list_file = f.name
+
+    try:
+        subprocess.run(
+            [
+                _ffmpeg(), "-hide_banner", "-loglevel", "error", "-y",
+                "-f", "concat", "-safe", "0", "-i", list_file,
+                "-c", "copy", "-movflags", "+faststart",
+                output
+            ],
+            check=True,
+            capture_output=True
+        )
+    finally:
+        os.remove(list_file)
+
+
+def _concat_reencode(paths, output: str):
+    from moviepy import VideoFileClip, concatenate_videoclips
+
+    clips = [VideoFileClip(p) for p in paths]
+    try:
+        final = concatenate_videoclips(clips, method="compose")
+        final.write_videofile(output, codec="libx264", audio_codec="aac", logger=None)
+    finally:
+        for clip in clips:
+            clip.close()
+
+
+def assemble_clips(paths, output: str) -> str:
+    """Join `paths` in order into `output`; returns the method used"""
+    if not paths:
+        raise RuntimeError("❌ No clips to assemble")
+
+    signatures = {probe_signature(p) for p in paths}
+
+    if len(signatures) == 1:
+        print(f"🧩 Concatenating {len(paths)} clips (stream copy)")
+        try:
+            _concat_copy(paths, output)
+            return "copy"
+        except subprocess.CalledProcessError as e:
+            stderr = e.stderr.decode(errors="replace").strip() if e.stderr else e
+            print(f"⚠️ Stream copy failed, re-encoding instead: {stderr}")
+    else:
+        print(f"🧩 Clips differ in format ({len(signatures)} variants), re-encoding")
+
+    _concat_reencode(paths, output)
+    return "reencode"
@@ -0,0 +1,344 @@
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import resource
+import tempfile
+import subprocess
+
+from fake_servers import FakeLeonardo, FakeDrive, FakeGemini
+
+# =========================
+# OFFLINE BENCHMARK SUITE
+# =========================
+# Runs the real pipeline code against the local stand-ins in
+# fake_servers.py and reports wall time, requests issued, bytes moved
+# and peak RSS. Each scenario runs in its own subprocess so RSS and
+# module-level state never leak between scenarios.
+#
+#   python benchmark.py                       # all scenarios
+#   python benchmark.py pipeline --scenes 7 --render-time uniform:3:6
+#   python benchmark.py imports               # cold import times, no credentials
+#   python benchmark.py --json bench.json --baseline old.json
+
+RESULT_MARKER = "BENCH_RESULT "
+
+
+def _fake_google_token() -> str:
+    # google-auth always refreshes against Google's real token endpoint,
+    # so hand out an access token that never needs refreshing
+    return json.dumps({
+        "token": "fake-access-token",
+        "expiry": "2099-01-01T00:00:00Z",
+        "refresh_token": "fake-refresh",
+        "client_id": "fake-client",
+        "client_secret": "fake-secret",
+    })
+
+
+def _leonardo(args):
+    clip_bytes = None
+    if args.clip_file:
+        with open(args.clip_file, "rb") as f:
+            clip_bytes = f.read()
+
+    return FakeLeonardo(
+        render_time=args.render_time,
+        job_failure_rate=args.job_failure_rate,
+        file_size=int(args.clip_size_mb * 1024 * 1024),
+        clip_bytes=clip_bytes,
+        ranges=not args.no_ranges,
+        cdn_bytes_per_s=args.cdn_mbps * 1024 * 1024,
+        latency=args.latency,
+        failure_rate=args.failure_rate
+    ).start()
+
+
+def _drive(args):
+    return FakeDrive(
+        corrupt_rate=args.drive_corrupt_rate,
+        latency=args.latency,
+        failure_rate=args.failure_rate
+    ).start()
+
+
+# =========================
+# SCENARIOS
+# =========================
+def bench_pipeline(args):
+    """main.main() end to end: generate → poll → download → upload (→ assemble)"""
+    leonardo = _leonardo(args)
+    drive = _drive(args)
+
+    os.environ.update({
+        "LEONARDO_API_KEY": "fake-key",
+        "LEONARDO_API_BASE": leonardo.url,
+        "DRIVE_API_ROOT": drive.url,
+        "GOOGLE_TOKEN": _fake_google_token(),
+        # Random bytes can't be concatenated; assemble only real MP4s
+        "ASSEMBLE_FINAL": "1" if args.clip_file else "0",
+    })
+
+    services = {}
+    if args.prompts != "file":
+        # prompt_generator always asks Gemini for 7 scenes
+        gemini = FakeGemini(scenes=7, latency=args.gemini_latency).start()
+        services["gemini"] = gemini
+        os.environ.update({
+            "GEMINI_API_KEY": "fake-key",
+            "GEMINI_BASE_URL": gemini.url,
+            "STREAM_PROMPTS": "1" if args.prompts == "stream" else "0",
+        })
+
+    os.makedirs("ytauto", exist_ok=True)
+    if args.prompts == "file" and args.videos > 1:
+        os.environ["BATCH_MODE"] = "1"
+        videos = [
+            {"name": f"video{v}", "theme": "benchmark", "scenes": [f"benchmark video {v} scene {i}" for i in range(1, args.scenes + 1)]}
+            for v in range(1, args.videos + 1)
+        ]
+        with open(os.path.join("ytauto", "batch.json"), "w", encoding="utf-8") as f:
+            json.dump({"videos": videos}, f)
+    elif args.prompts == "file":
+        with open(os.path.join("ytauto", "prompts.json"), "w", encoding="utf-8") as f:
+            json.dump({"scenes": [f"benchmark scene {i}" for i in range(1, args.scenes + 1)]}, f)
+
+    import main
+    main.POLL_INTERVAL = args.poll_interval
+    main.MIN_POLL_INTERVAL = min(main.MIN_POLL_INTERVAL, args.poll_interval)
+
+    start = time.perf_counter()
+    if args.prompts == "generate":
+        import prompt_generator
+        prompt_generator.generate_scene_prompts()
+    main.main()
+    wall = time.perf_counter() - start
+
+    services.update({"leonardo": leonardo, "drive": drive})
+    return wall, {name: service.stats() for name, service in services.items()}
+
+
+def bench_upload(args):
+    """uploader.upload_video_to_drive() for `--scenes` local clips, `--rounds` times over"""
+    drive = _drive(args)
+
+    os.environ.update({
+        "DRIVE_API_ROOT": drive.url,
+        "GOOGLE_TOKEN": _fake_google_token(),
+    })
+
+    size = int(args.clip_size_mb * 1024 * 1024)
+    paths = []
+    for i in range(1, args.scenes + 1):
+        path = f"clip_{i}.mp4"
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+
+    import uploader
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        # A fresh uploader per round, like a rerun of the whole job
+        drive_uploader = uploader.DriveUploader()
+        for path in paths:
+            drive_uploader.upload_video(path)
+    wall = time.perf_counter() - start
+
+    return wall, {"drive": drive.stats()}
+
+
+def bench_prompts(args):
+    """prompt_generator.generate_scene_prompts() against a fake Gemini"""
+    gemini = FakeGemini(scenes=7, latency=args.gemini_latency).start()
+
+    os.environ.update({
+        "GEMINI_API_KEY": "fake-key",
+        "GEMINI_BASE_URL": gemini.url,
+    })
+
+    import prompt_generator
+
+    if args.pregenerate:
+        # Fill the queue the way an earlier run would, then time today's run
+        today = prompt_generator._today
+        prompt_generator._today = lambda: today() - datetime.timedelta(days=1)
+        prompt_generator.pregenerate_prompts(days=args.pregenerate)
+        prompt_generator._today = today
+
+    start = time.perf_counter()
+    prompt_generator.generate_scene_prompts()
+    wall = time.perf_counter() - start
+
+    return wall, {"gemini": gemini.stats()}
+
+
+IMPORT_MODULES = ("main", "prompt_generator", "uploader", "http_client", "metrics_store")
+CREDENTIAL_VARS = ("LEONARDO_API_KEY", "LEONARDO_API_KEYS", "GEMINI_API_KEY", "GOOGLE_TOKEN")
+
+
+def bench_imports(args):
+    """Cold import of each entry module in a fresh interpreter, with no credentials set"""
+    env = {k: v for k, v in os.environ.items() if k not in CREDENTIAL_VARS}
+    env["PYTHONPATH"] = os.path.dirname(os.path.abspath(__file__))
+
+    seconds = {}
+    for module in IMPORT_MODULES:
+        code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+        runs = []
+        # Best of three: the first run also pays for cold .pyc and page caches
+        for _ in range(3):
+            proc = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise RuntimeError(f"❌ import {module} failed without credentials:\n{proc.stderr}")
+            runs.append(float(proc.stdout.split()[-1]))
+        seconds[module] = round(min(runs), 4)
+        print(f"📦 import {module}: {seconds[module] * 1000:.0f} ms")
+
+    return sum(seconds.values()), {"imports": {"requests": 0, "bytes_in": 0, "bytes_out": 0, "seconds": seconds}}
+
+
+SCENARIOS = {
+    "pipeline": bench_pipeline,
+    "upload": bench_upload,
+    "prompts": bench_prompts,
+    "imports": bench_imports,
+}
+
+
+# =========================
+# RUNNER
+# =========================
+def _run_child(name: str, args):
+    if args.clip_file:
+        args.clip_file = os.path.abspath(args.clip_file)
+    os.chdir(tempfile.mkdtemp(prefix=f"bench-{name}-"))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    wall, services = SCENARIOS[name](args)
+
+    result = {
+        "scenario": name,
+        "wall_s": round(wall, 3),
+        "requests": sum(s["requests"] for s in services.values()),
+        "bytes_in": sum(s["bytes_in"] for s in services.values()),
+        "bytes_out": sum(s["bytes_out"] for s in services.values()),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "services": services,
+    }
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+
+
+def run_scenario(name: str, argv, verbose: bool = False) -> dict:
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name, *argv],
+        capture_output=True,
+        text=True
+    )
+
+    if verbose or proc.returncode != 0:
+        sys.stdout.write(proc.stdout)
+        sys.stderr.write(proc.stderr)
+
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+
+    raise RuntimeError(f"❌ Scenario {name} produced no result (exit {proc.returncode})")
+
+
+def print_table(results):
+    print(f"\n{'scenario':<10} {'wall s':>8} {'requests':>9} {'MB in':>8} {'MB out':>8} {'peak RSS MB':>12}")
+    for r in results:
+        print(
+            f"{r['scenario']:<10} {r['wall_s']:>8.2f} {r['requests']:>9} "
+            f"{r['bytes_in'] / 1e6:>8.2f} {r['bytes_out'] / 1e6:>8.2f} {r['peak_rss_mb']:>12.1f}"
+        )
+
+
+def compare(results, baseline_path: str, tolerance: float) -> bool:
+    """Flag wall time / request count regressions beyond `tolerance`; True if clean"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["scenario"]: r for r in json.load(f)}
+
+    clean = True
+    for r in results:
+        old = baseline.get(r["scenario"])
+        if not old:
+            continue
+        for metric in ("wall_s", "requests", "peak_rss_mb"):
+            if old[metric] and r[metric] > old[metric] * (1 + tolerance):
+                print(f"⚠️ {r['scenario']}: {metric} regressed {old[metric]} → {r[metric]}")
+                clean = False
+    return clean
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Offline benchmarks against local fake APIs")
+    parser.add_argument("scenarios", nargs="*", help=f"any of: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--scenes", type=int, default=7)
+    parser.add_argument("--rounds", type=int, default=1, help="upload: upload the same clips this many times")
+    parser.add_argument("--videos", type=int, default=1, help="pipeline: videos per run (batch mode when > 1)")
+    parser.add_argument(
+        "--prompts", default="file", choices=("file", "generate", "stream"),
+        help="pipeline: read prompts.json, generate it with Gemini first, or stream scenes into the run"
+    )
+    parser.add_argument(
+        "--pregenerate", type=int, default=0, metavar="DAYS",
+        help="prompts: queue DAYS days of prompts before the timed run"
+    )
+    parser.add_argument("--render-time", default="uniform:2:4", help="Leonardo render time distribution")
+    parser.add_argument("--latency", default="const:0.02", help="per-request latency distribution")
+    parser.add_argument("--gemini-latency", default="uniform:1:2")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="injected HTTP 429/5xx rate")
+    parser.add_argument("--job-failure-rate", type=float, default=0.0, help="Leonardo FAILED rate")
+    parser.add_argument("--drive-corrupt-rate", type=float, default=0.0, help="Drive uploads stored corrupted")
+    parser.add_argument("--clip-size-mb", type=float, default=4.0)
+    parser.add_argument("--cdn-mbps", type=float, default=0, help="MB/s per CDN connection (0 = unlimited)")
+    parser.add_argument("--no-ranges", action="store_true", help="CDN ignores Range headers")
+    parser.add_argument("--clip-file", help="serve this MP4 instead of random bytes (enables assembly)")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true", help="show pipeline output")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    if args.child:
+        _run_child(args.child, args)
+        return 0
+
+    # Forward every option except the scenario names to the children
+    passthrough = [a for a in argv if a not in SCENARIOS]
+    results = []
+    for name in args.scenarios or list(SCENARIOS):
+        print(f"⏱️ Running {name}...")
+        results.append(run_scenario(name, passthrough, args.verbose))
+
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline and not compare(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+# =========================
+# CONTENT-ADDRESSED CLIP CACHE
+# =========================
+# Rendered clips are keyed by a hash of the exact Leonardo generation
+# payload, so the same prompt/model/isPublic never renders twice:
+#
+#   <key>.json  -> {"video_url", "generation_id"}
+#   <key>.mp4   -> the downloaded clip (optional, evicted LRU by mtime)
+
+
+def cache_key(payload: dict) -> str:
+    blob = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ClipCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _clip_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp4")
+
+    def lookup(self, key: str):
+        """Cached entry for `key` (with "file" when the MP4 is on disk), or None"""
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        clip = self._clip_path(key)
+        if os.path.exists(clip):
+            os.utime(clip)  # mark as recently used
+            entry["file"] = clip
+        return entry
+
+    def materialize(self, entry: dict, filepath: str):
+        """Place a cached clip at `filepath` (hard link when possible)"""
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        _link_or_copy(entry["file"], filepath)
+
+    def store(self, key: str, video_url: str, generation_id: str = None, filepath: str = None):
+        meta = {"video_url": video_url, "generation_id": generation_id}
+
+        with self._lock:
+            tmp = self._meta_path(key) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self._meta_path(key))
+
+            if filepath and self.max_bytes > 0:
+                tmp = self._clip_path(key) + ".tmp"
+                _link_or_copy(filepath, tmp)
+                os.replace(tmp, self._clip_path(key))
+                self._evict()
+
+    def forget(self, key: str):
+        """Drop `key` entirely, e.g. once its video URL stops resolving"""
+        with self._lock:
+            for path in (self._meta_path(key), self._clip_path(key)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _evict(self):
+        clips = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".mp4"):
+                path = os.path.join(self.directory, name)
+                st = os.stat(path)
+                clips.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in clips)
+        for _, size, path in sorted(clips):
+            if total <= self.max_bytes:
+                break
+            # Metadata stays behind: a URL-only hit still skips rendering
+            os.remove(path)
+            total -= size
+            print(f"🧹 Evicted cached clip {os.path.basename(path)}")
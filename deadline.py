@@ -0,0 +1,37 @@
+import time
+
+# =========================
+# RUN DEADLINE
+# =========================
+# One time budget for a whole run, handed down to every wait that could
+# otherwise run long: HTTP requests and their retry sleeps, status
+# polling, downloads and upload chunks. Once it passes, those waits stop
+# at their next check and raise DeadlineExceeded.
+
+
+class DeadlineExceeded(RuntimeError):
+    """The run deadline passed before the step finished"""
+
+
+class Deadline:
+    def __init__(self, seconds: float = None):
+        """`seconds` from now; None never expires"""
+        self.seconds = seconds
+        self.expires = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        if self.expires is None:
+            return float("inf")
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, what: str = "run"):
+        if self.expired():
+            raise DeadlineExceeded(f"Run deadline of {self.seconds:.0f}s reached during {what}")
+
+    def timeout(self, seconds: float, what: str = "request") -> float:
+        """`seconds` capped to what is left, for socket timeouts"""
+        self.check(what)
+        return min(seconds, self.remaining())
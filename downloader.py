@@ -0,0 +1,262 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import http_client
+from integrity import IntegrityError, TransferHash, verify
+
+# =========================
+# SEGMENTED DOWNLOADS
+# =========================
+# A file larger than one segment is fetched as several byte ranges at
+# once, each written straight into its slot of a preallocated file. The
+# ranges already on disk are recorded in a `<file>.part.json` sidecar, so
+# a retry (or the next run) only fetches what is missing. The first
+# range request doubles as the probe: a 206 carries the total size, a
+# 200 means the server ignores Range and the body is streamed as is.
+# Every response is checked against the size it declares as it arrives,
+# so a truncated clip never reaches the upload stage.
+
+SEGMENT_SIZE = int(os.getenv("DOWNLOAD_SEGMENT_MB", "4")) * 1024 * 1024
+SEGMENT_WORKERS = int(os.getenv("DOWNLOAD_SEGMENT_WORKERS", "4"))  # concurrent ranges per file
+SEGMENT_RETRIES = 2           # re-requests of a range whose body dropped mid-transfer
+READ_SIZE = 1024 * 1024
+
+
+class DownloadError(RuntimeError):
+    """A download failed; `retryable` says whether another attempt could help"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class _RangesIgnored(DownloadError):
+    """The server answered a range request with the whole file"""
+
+
+class _SourceChanged(IntegrityError):
+    """A range came back from a file of a different size than the one being resumed"""
+
+
+def _state_path(path: str) -> str:
+    return path + ".part.json"
+
+
+def _load_state(path: str, url: str):
+    """Progress of an interrupted segmented download of `url` into `path`"""
+    try:
+        with open(_state_path(path), "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if state.get("url") != url or not os.path.exists(path) or os.path.getsize(path) != state.get("size"):
+        return None
+    return state
+
+
+def _save_state(path: str, state: dict):
+    tmp = _state_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, _state_path(path))
+
+
+def _clear_state(path: str):
+    if os.path.exists(_state_path(path)):
+        os.remove(_state_path(path))
+
+
+def has_partial(path: str, url: str) -> bool:
+    """`path` holds an interrupted segmented download of `url` that download_file() can resume"""
+    return _load_state(path, url) is not None
+
+
+def discard(path: str):
+    """Remove `path` and its resume sidecar, if any"""
+    _clear_state(path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _preallocate(path: str, size: int):
+    with open(path, "wb") as f:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            f.truncate(size)
+
+
+def _failed(response, what: str) -> DownloadError:
+    status = response.status_code if response is not None else "no response"
+    retryable = response is None or response.status_code in http_client.RETRYABLE_STATUS
+    return DownloadError(f"❌ {what} failed ({status})", retryable)
+
+
+def _stream_whole(response, path: str, deadline=None) -> int:
+    """Single-stream fallback: the whole body, front to back"""
+    import requests
+
+    transferred = TransferHash()
+    try:
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=READ_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    transferred.update(chunk)
+                if deadline is not None:
+                    deadline.check("download")
+    except requests.RequestException as e:
+        raise DownloadError(f"❌ Download interrupted after {transferred.size} bytes: {e}")
+
+    try:
+        verify(os.path.basename(path), transferred, size=http_client.declared_size(response))
+    except IntegrityError:
+        os.remove(path)
+        raise
+    return transferred.size
+
+
+# =========================
+# SEGMENTS
+# =========================
+class _Segment:
+    def __init__(self, index: int, start: int, end: int):
+        self.index = index
+        self.start = start
+        self.end = end          # inclusive
+
+
+def _segments(size: int, segment_size: int):
+    return [
+        _Segment(i, start, min(start + segment_size, size) - 1)
+        for i, start in enumerate(range(0, size, segment_size))
+    ]
+
+
+def _fetch_segment(url: str, path: str, size: int, segment: _Segment, response=None, label: str = "",
+                   deadline=None):
+    """Write bytes [start, end] of `url` into `path`; `response` is an already-open 206 for them"""
+    import requests
+
+    position = segment.start
+    retries = 0
+
+    with open(path, "r+b") as f:
+        while position <= segment.end:
+            if response is None:
+                response = http_client.request(
+                    "GET", url,
+                    headers={"Range": f"bytes={position}-{segment.end}"},
+                    stream=True,
+                    timeout=60,
+                    label=label,
+                    deadline=deadline
+                )
+                if response is not None and response.status_code == 200:
+                    response.close()
+                    raise _RangesIgnored(f"❌ Server stopped honouring byte ranges at {position}")
+                if response is None or response.status_code != 206:
+                    raise _failed(response, f"Range {position}-{segment.end}")
+
+            if http_client.parse_content_range(response) != (position, size):
+                response.close()
+                raise _SourceChanged(
+                    f"❌ Range {position}-{segment.end} answered with "
+                    f"{response.headers.get('Content-Range')!r}, expected a file of {size} bytes"
+                )
+
+            f.seek(position)
+            error = None
+            try:
+                for chunk in response.iter_content(chunk_size=READ_SIZE):
+                    chunk = chunk[:segment.end + 1 - position]
+                    f.write(chunk)
+                    position += len(chunk)
+                    if deadline is not None:
+                        deadline.check("download")
+                    if position > segment.end:
+                        break
+            except requests.RequestException as e:
+                error = e
+            finally:
+                response.close()
+                response = None
+
+            if position <= segment.end:
+                # Dropped or cut short: ask again for just the rest of the range
+                retries += 1
+                if retries > SEGMENT_RETRIES:
+                    raise DownloadError(f"❌ Range {segment.start}-{segment.end} incomplete at byte {position}: {error}")
+                print(f"{label}⚠️ Range {segment.index} ended early ({error or 'short body'}), resuming at byte {position}")
+
+
+# =========================
+# DOWNLOAD
+# =========================
+def download_file(url: str, path: str, label: str = "", deadline=None,
+                  workers: int = SEGMENT_WORKERS, segment_size: int = SEGMENT_SIZE) -> int:
+    """Download `url` to `path` in concurrent ranges, resuming earlier progress
+
+    Returns the file size. Raises DownloadError; completed ranges stay on
+    disk so the next call for the same URL and path picks up from there.
+    """
+    state = _load_state(path, url)
+    probe = None
+
+    if state is None:
+        probe = http_client.request(
+            "GET", url,
+            headers={"Range": f"bytes=0-{segment_size - 1}"},
+            stream=True,
+            timeout=60,
+            label=label,
+            deadline=deadline
+        )
+        if probe is None or probe.status_code not in (200, 206):
+            raise _failed(probe, "Download")
+
+        size = http_client.parse_content_range(probe)[1] if probe.status_code == 206 else None
+        if size is None:
+            print(f"{label}📥 Server ignores byte ranges, downloading in one stream")
+            _clear_state(path)
+            return _stream_whole(probe, path, deadline)
+
+        state = {"url": url, "size": size, "segment_size": segment_size, "done": []}
+        _preallocate(path, size)
+        if size > segment_size:
+            _save_state(path, state)
+    else:
+        print(f"{label}📥 Resuming download: {len(state['done'])} ranges already on disk")
+
+    segments = _segments(state["size"], state["segment_size"])
+    missing = [s for s in segments if s.index not in state["done"]]
+    lock = threading.Lock()
+
+    def fetch(segment: _Segment):
+        response = probe if probe is not None and segment.index == 0 else None
+        _fetch_segment(url, path, state["size"], segment, response, label, deadline)
+        with lock:
+            state["done"].append(segment.index)
+            _save_state(path, state)
+
+    if len(missing) > 1:
+        print(f"{label}📥 Fetching {len(missing)} ranges ({state['size'] / 1e6:.1f} MB)")
+
+    # Let every range run to completion (or failure) so all finished
+    # ranges are recorded before the first error is raised
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(missing)))) as executor:
+        futures = [executor.submit(fetch, segment) for segment in missing]
+    errors = [e for e in (f.exception() for f in futures) if e is not None]
+    if any(isinstance(e, (_RangesIgnored, _SourceChanged)) for e in errors):
+        # Nothing to resume against; the next attempt probes again
+        _clear_state(path)
+    if errors:
+        raise errors[0]
+
+    _clear_state(path)
+    if os.path.getsize(path) != state["size"]:
+        os.remove(path)
+        raise IntegrityError(f"❌ {os.path.basename(path)}: file on disk is not {state['size']} bytes")
+    return state["size"]
@@ -0,0 +1,461 @@
+import re
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+import collections
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# =========================
+# LOCAL STAND-IN SERVERS
+# =========================
+# Minimal fakes of the Leonardo, Google Drive and Gemini endpoints the
+# pipeline talks to, so runs can be measured offline without credits.
+# Each fake counts requests and bytes, and can inject latency, HTTP
+# failures and job failures from configurable distributions.
+
+
+def parse_distribution(spec):
+    """Seconds sampler from "const:X", "uniform:A:B", "normal:MU:SIGMA" or "lognormal:MU:SIGMA" """
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+
+    kind, *args = spec.split(":")
+    args = [float(a) for a in args]
+
+    if kind == "const":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(args[0], args[1])
+    raise ValueError(f"Unknown distribution: {spec}")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _dispatch(self):
+        service = self.server.service
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        parsed = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        status, headers, payload = service.handle(self.command, parsed.path, query, self.headers, body)
+
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode("utf-8")
+            headers = {"Content-Type": "application/json", **headers}
+
+        if not isinstance(payload, bytes):
+            sent = self._send_chunked(status, headers, payload)
+            service.record(self.command, parsed.path, len(body), sent)
+            return
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+        service.record(self.command, parsed.path, len(body), len(payload))
+
+    def _send_chunked(self, status, headers, chunks) -> int:
+        """Stream an iterable of byte chunks with chunked transfer encoding"""
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        sent = 0
+        for chunk in chunks:
+            self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+            sent += len(chunk)
+        self.wfile.write(b"0\r\n\r\n")
+        return sent
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _dispatch
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeService:
+    """Base class: runs a threaded HTTP server and keeps traffic counters"""
+
+    def __init__(self, latency="const:0", failure_rate: float = 0.0, retry_after: float = 1):
+        self.latency = parse_distribution(latency)
+        self.failure_rate = failure_rate
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.requests = collections.Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._server = None
+
+    # ---------- LIFECYCLE ----------
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    # ---------- COUNTERS ----------
+    def record(self, method, path, bytes_in, bytes_out):
+        with self.lock:
+            self.requests[f"{method} {self.route_name(path)}"] += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def route_name(self, path: str) -> str:
+        return path
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "by_route": dict(self.requests),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+
+    # ---------- REQUESTS ----------
+    def handle(self, method, path, query, headers, body):
+        time.sleep(self.latency())
+
+        if self.failure_rate and random.random() < self.failure_rate:
+            code = random.choice((429, 500, 503))
+            return code, {"Retry-After": str(self.retry_after)}, {"error": "injected failure"}
+
+        return self.route(method, path, query, headers, body)
+
+    def route(self, method, path, query, headers, body):
+        return 404, {}, {"error": "not found"}
+
+
+def _throttled(data: bytes, bytes_per_s: float, piece: int = 256 * 1024):
+    """`data` in pieces paced to `bytes_per_s` on this connection"""
+    for i in range(0, len(data), piece):
+        chunk = data[i:i + piece]
+        time.sleep(len(chunk) / bytes_per_s)
+        yield chunk
+
+
+def _serve_bytes(data: bytes, headers, ranges: bool = True, bytes_per_s: float = 0):
+    """200 or 206 response for `data`, honouring a single Range header
+
+    With `ranges` off the header is ignored; `bytes_per_s` caps each
+    response's throughput (sent chunked).
+    """
+    status, response_headers, body = _byte_range(data, headers.get("Range") if ranges else None)
+    if not ranges:
+        response_headers.pop("Accept-Ranges", None)
+    if bytes_per_s and body:
+        body = _throttled(body, bytes_per_s)
+    return status, response_headers, body
+
+
+def _byte_range(data: bytes, rng):
+    base = {"Accept-Ranges": "bytes", "Content-Type": "video/mp4"}
+
+    if not rng or not rng.startswith("bytes="):
+        return 200, base, data
+
+    start, _, end = rng[len("bytes="):].partition("-")
+    start = int(start)
+    end = int(end) if end else len(data) - 1
+    end = min(end, len(data) - 1)
+    if start >= len(data):
+        return 416, {"Content-Range": f"bytes */{len(data)}"}, b""
+
+    return 206, {**base, "Content-Range": f"bytes {start}-{end}/{len(data)}"}, data[start:end + 1]
+
+
+# =========================
+# LEONARDO
+# =========================
+class FakeLeonardo(FakeService):
+    """generations-text-to-video, generations/{id} and the MP4 CDN"""
+
+    def __init__(self, render_time="uniform:2:4", job_failure_rate: float = 0.0,
+                 file_size: int = 4 * 1024 * 1024, clip_bytes: bytes = None,
+                 ranges: bool = True, cdn_bytes_per_s: float = 0, **kwargs):
+        super().__init__(**kwargs)
+        # CDN behaviour: Range support and per-connection throughput (0 = unlimited)
+        self.ranges = ranges
+        self.cdn_bytes_per_s = cdn_bytes_per_s
+        self.render_time = parse_distribution(render_time)
+        self.job_failure_rate = job_failure_rate
+        self.clip = clip_bytes if clip_bytes is not None else random.randbytes(file_size)
+        # Random clips get the generation ID stamped in, so no two renders
+        # are byte-identical (a real MP4 from --clip-file is served as is)
+        self.unique_clips = clip_bytes is None
+        self.jobs = {}
+
+    def route_name(self, path):
+        if path.startswith("/generations/"):
+            return "/generations/{id}"
+        if path.startswith("/mp4/"):
+            return "/mp4/{id}.mp4"
+        return path
+
+    def route(self, method, path, query, headers, body):
+        if method == "POST" and path == "/generations-text-to-video":
+            gen_id = str(uuid.uuid4())
+            with self.lock:
+                self.jobs[gen_id] = {
+                    "ready_at": time.monotonic() + self.render_time(),
+                    "fails": random.random() < self.job_failure_rate,
+                }
+            return 200, {}, {"motionVideoGenerationJob": {"generationId": gen_id, "apiCreditCost": 25}}
+
+        if method == "GET" and path.startswith("/generations/"):
+            gen_id = path.rsplit("/", 1)[1]
+            job = self.jobs.get(gen_id)
+            if not job:
+                return 200, {}, {"generations_by_pk": None}
+
+            if time.monotonic() < job["ready_at"]:
+                status = "PENDING"
+            else:
+                status = "FAILED" if job["fails"] else "COMPLETE"
+
+            generation = {"id": gen_id, "status": status, "generated_images": []}
+            if status == "COMPLETE":
+                generation["generated_images"] = [{"motionMP4URL": f"{self.url}/mp4/{gen_id}.mp4"}]
+            return 200, {}, {"generations_by_pk": generation}
+
+        if method in ("GET", "HEAD") and path.startswith("/mp4/"):
+            clip = self.clip
+            if self.unique_clips:
+                stamp = path.encode("utf-8")[:len(clip)]
+                clip = stamp + clip[len(stamp):]
+            return _serve_bytes(clip, headers, self.ranges, self.cdn_bytes_per_s)
+
+        return 404, {}, {"error": "not found"}
+
+
+# =========================
+# GOOGLE DRIVE
+# =========================
+class FakeDrive(FakeService):
+    """Drive v3 files list/create/update/get/delete/copy and resumable uploads"""
+
+    def __init__(self, corrupt_rate: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        # Share of finished uploads stored with one byte flipped
+        self.corrupt_rate = corrupt_rate
+        self.files = {}
+        self.sessions = {}
+
+    def route_name(self, path):
+        if path.startswith("/upload/drive/v3/files"):
+            return "/upload/drive/v3/files"
+        if path.startswith("/drive/v3/files/") and path.endswith("/copy"):
+            return "/drive/v3/files/{id}/copy"
+        if path.startswith("/drive/v3/files/"):
+            return "/drive/v3/files/{id}"
+        return path
+
+    def _matches(self, meta: dict, q: str) -> bool:
+        for clause in q.split(" and "):
+            clause = clause.strip()
+            if clause.startswith("name="):
+                if meta["name"] != clause[len("name="):].strip("'"):
+                    return False
+            elif clause.startswith("mimeType="):
+                if meta.get("mimeType") != clause[len("mimeType="):].strip("'"):
+                    return False
+            elif clause.endswith(" in parents"):
+                if clause.split("'")[1] not in meta.get("parents", []):
+                    return False
+        return True
+
+    def _store(self, file_id, data: bytes):
+        meta = self.files[file_id]
+        meta["size"] = str(len(data))
+        meta["md5Checksum"] = hashlib.md5(data).hexdigest()
+        meta["data"] = data
+
+    def _public(self, meta: dict) -> dict:
+        return {k: v for k, v in meta.items() if k != "data"}
+
+    def route(self, method, path, query, headers, body):
+        if path == "/drive/v3/files" and method == "GET":
+            q = query.get("q", "")
+            with self.lock:
+                files = [self._public(m) for m in self.files.values() if self._matches(m, q)]
+            return 200, {}, {"files": files}
+
+        if path == "/drive/v3/files" and method == "POST":
+            meta = json.loads(body or b"{}")
+            file_id = uuid.uuid4().hex
+            with self.lock:
+                self.files[file_id] = {"id": file_id, **meta}
+            return 200, {}, {"id": file_id, **meta}
+
+        if path.startswith("/drive/v3/files/") and path.endswith("/copy") and method == "POST":
+            source_id = path.split("/")[-2]
+            with self.lock:
+                source = self.files.get(source_id)
+                if not source:
+                    return 404, {}, {"error": {"code": 404, "message": "File not found"}}
+                file_id = uuid.uuid4().hex
+                self.files[file_id] = {**source, "id": file_id, **json.loads(body or b"{}")}
+                return 200, {}, self._public(self.files[file_id])
+
+        if path.startswith("/drive/v3/files/"):
+            file_id = path.rsplit("/", 1)[1]
+            with self.lock:
+                meta = self.files.get(file_id)
+                if not meta:
+                    return 404, {}, {"error": {"code": 404, "message": "File not found"}}
+                if method == "DELETE":
+                    del self.files[file_id]
+                    return 204, {}, b""
+                if method == "PATCH":
+                    meta.update(json.loads(body or b"{}"))
+                return 200, {}, self._public(meta)
+
+        if path.startswith("/upload/drive/v3/files"):
+            return self._upload(method, path, query, headers, body)
+
+        return 404, {}, {"error": "not found"}
+
+    def _upload(self, method, path, query, headers, body):
+        upload_id = query.get("upload_id")
+
+        if upload_id is None and method in ("POST", "PATCH"):
+            meta = json.loads(body or b"{}")
+            with self.lock:
+                if method == "PATCH":
+                    file_id = path.rsplit("/", 1)[1]
+                    if file_id not in self.files:
+                        return 404, {}, {"error": {"code": 404, "message": "File not found"}}
+                else:
+                    file_id = uuid.uuid4().hex
+                    parents = meta.get("parents", [])
+                    if any(p not in self.files for p in parents):
+                        return 404, {}, {"error": {"code": 404, "message": "File not found"}}
+                upload_id = uuid.uuid4().hex
+                self.sessions[upload_id] = {"file_id": file_id, "meta": meta, "data": bytearray()}
+            location = f"{self.url}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+            return 200, {"Location": location}, b""
+
+        session = self.sessions.get(upload_id)
+        if not session:
+            return 404, {}, {"error": {"code": 404, "message": "Upload session not found"}}
+
+        content_range = headers.get("Content-Range", "")
+        spec, _, total = content_range.replace("bytes ", "").partition("/")
+        data = session["data"]
+
+        if spec != "*":
+            start = int(spec.split("-")[0])
+            if start != len(data):
+                return 400, {}, {"error": "offset mismatch"}
+            data.extend(body)
+
+        if total not in ("*", "") and int(total) == len(data):
+            with self.lock:
+                file_id = session["file_id"]
+                meta = self.files.setdefault(file_id, {"id": file_id})
+                meta.update(session["meta"])
+                if data and random.random() < self.corrupt_rate:
+                    data[len(data) // 2] ^= 0xFF
+                self._store(file_id, bytes(data))
+                del self.sessions[upload_id]
+                return 200, {}, self._public(meta)
+
+        range_header = {"Range": f"bytes=0-{len(data) - 1}"} if data else {}
+        return 308, range_header, b""
+
+
+# =========================
+# GEMINI
+# =========================
+class FakeGemini(FakeService):
+    """models/{model}:generateContent (and :streamGenerateContent) returning {"scenes": [...]}
+
+    A request whose response schema asks for "days" (multi-day
+    pre-generation) gets one scene set per date listed in the prompt.
+    """
+
+    def __init__(self, scenes: int = 7, scene_interval="const:0.2", **kwargs):
+        super().__init__(**kwargs)
+        self.scenes = scenes
+        # Streaming: time between successive scenes after the first token
+        self.scene_interval = parse_distribution(scene_interval)
+
+    def route_name(self, path):
+        return path.split("/models/")[0] + "/models/{model}:" + path.rsplit(":", 1)[-1]
+
+    def scene_texts(self):
+        return [
+            f"Scene {i}: sweeping aerial shot over a misty fjord at dawn, camera move {i}"
+            for i in range(1, self.scenes + 1)
+        ]
+
+    def _response(self, text: str, final: bool = True) -> dict:
+        candidate = {"content": {"role": "model", "parts": [{"text": text}]}}
+        if final:
+            candidate["finishReason"] = "STOP"
+        return {"candidates": [candidate]}
+
+    def _stream(self):
+        """Server-sent events, one piece of the JSON array per event"""
+        texts = self.scene_texts()
+        pieces = ['```json\n{"scenes": [']
+        for i, text in enumerate(texts):
+            # Split each scene across two events, like token streaming does
+            encoded = json.dumps(text) + ("," if i + 1 < len(texts) else "]}\n```")
+            half = len(encoded) // 2
+            pieces += [encoded[:half], encoded[half:]]
+
+        for i, piece in enumerate(pieces):
+            if i > 1 and i % 2 == 1:
+                time.sleep(self.scene_interval())
+            event = json.dumps(self._response(piece, final=i + 1 == len(pieces)))
+            yield f"data: {event}\r\n\r\n".encode("utf-8")
+
+    def _days(self, request: dict):
+        prompt = " ".join(
+            part.get("text", "")
+            for content in request.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        dates = list(dict.fromkeys(re.findall(r"^- (\d{4}-\d{2}-\d{2})", prompt, re.M)))
+        return {"days": [{"date": date, "scenes": self.scene_texts()} for date in dates]}
+
+    def route(self, method, path, query, headers, body):
+        if method == "POST" and path.endswith(":generateContent"):
+            request = json.loads(body or b"{}")
+            schema = request.get("generationConfig", {}).get("responseSchema", {})
+            # The full answer takes as long to generate as the stream does
+            time.sleep(sum(self.scene_interval() for _ in range(self.scenes - 1)))
+            if "days" in schema.get("properties", {}):
+                return 200, {}, self._response(json.dumps(self._days(request)))
+            return 200, {}, self._response(json.dumps({"scenes": self.scene_texts()}))
+        if method == "POST" and path.endswith(":streamGenerateContent"):
+            return 200, {"Content-Type": "text/event-stream"}, self._stream()
+        return 404, {}, {"error": "not found"}
@@ -0,0 +1,208 @@
+import os
+import time
+import random
+import datetime
+import threading
+import contextlib
+import email.utils
+import urllib.parse
+import tracing
+
+# =========================
+# CONFIG
+# =========================
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))  # keep-alive connections per host
+HTTP_POOL_HOSTS = 10          # distinct hosts kept in the pool cache
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0            # seconds, doubled each attempt
+BACKOFF_MAX = 30.0            # seconds
+MAX_RETRY_AFTER = 120         # longer server hints are returned to the caller
+
+# 429 and transient server errors are worth retrying; other 4xx are not
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# =========================
+# SESSION
+# =========================
+def get_session():
+    """Process-wide pooled session shared by generation, polling and downloads"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Deferred: requests is the bulk of this module's import time
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_POOL_HOSTS,
+                pool_maxsize=HTTP_POOL_SIZE
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+# =========================
+# RETRY POLICY
+# =========================
+def parse_retry_after(response):
+    """Retry-After header in seconds (delta or HTTP date), or None"""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def parse_content_range(response):
+    """(first byte, total size) from `Content-Range: bytes a-b/total`, or (None, None)"""
+    spec, _, total = response.headers.get("Content-Range", "").partition("/")
+    first = spec.replace("bytes", "").strip().partition("-")[0]
+    if not first.isdigit() or not total.isdigit():
+        return None, None
+    return int(first), int(total)
+
+
+def declared_size(response):
+    """Size of the whole file behind a 200/206 response, when the server says"""
+    if response.status_code == 206:
+        return parse_content_range(response)[1]
+    # Content-Length counts encoded bytes, so it only applies to identity bodies
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit() and not response.headers.get("Content-Encoding"):
+        return int(length)
+    return None
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """Exponential backoff with full jitter, never shorter than Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def request(method, url, max_attempts: int = MAX_ATTEMPTS, label: str = "", deadline=None,
+            limiter=None, **kwargs):
+    """Send a request through the shared session, retrying transient failures
+
+    Returns the final response (which may still carry a retryable status
+    once attempts run out), or None if every attempt hit a network error.
+    With a deadline.Deadline, socket timeouts are capped to the time left,
+    retries stop when the backoff would outlast it, and DeadlineExceeded
+    is raised if it has already passed. With a rate_limiter.TokenBucket,
+    every attempt waits for a token and 429s slow the bucket down.
+    """
+    import requests
+
+    response = None
+    attempts = 0
+    start_wall = time.time()
+    start = time.perf_counter()
+
+    try:
+        for attempt in range(max_attempts):
+            attempts = attempt + 1
+            if limiter is not None:
+                _wait_for_token(limiter, deadline)
+            if deadline is not None:
+                kwargs["timeout"] = deadline.timeout(kwargs.get("timeout") or 60, f"{method} {url}")
+            try:
+                response = get_session().request(method, url, **kwargs)
+            except requests.RequestException as e:
+                print(f"{label}⚠️ Network error (attempt {attempt + 1}/{max_attempts}): {e}")
+                response = None
+            else:
+                if limiter is not None:
+                    if response.status_code == 429:
+                        limiter.throttle(parse_retry_after(response))
+                    elif response.status_code < 500:
+                        limiter.relax()
+                if response.status_code not in RETRYABLE_STATUS:
+                    return response
+                print(f"{label}⚠️ HTTP {response.status_code} (attempt {attempt + 1}/{max_attempts})")
+
+            if attempt + 1 >= max_attempts:
+                break
+
+            retry_after = parse_retry_after(response)
+            if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                print(f"{label}⚠️ Retry-After {retry_after:.0f}s is too long, giving up")
+                break
+
+            delay = backoff_delay(attempt, retry_after)
+            if deadline is not None and delay >= deadline.remaining():
+                print(f"{label}⚠️ No time left for another attempt before the run deadline")
+                break
+
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+        return response
+    finally:
+        _trace_request(method, url, response, attempts, start_wall, time.perf_counter() - start)
+
+
+def _wait_for_token(limiter, deadline):
+    start_wall = time.time()
+    waited = limiter.acquire(deadline)
+    if waited:
+        tracing.add(f"limit:{limiter.name}", start_wall, waited)
+
+
+def _trace_request(method, url, response, attempts, start_wall, duration):
+    if response is None:
+        http_status, size = None, 0
+    else:
+        http_status = response.status_code
+        # Streamed bodies are not read yet; Content-Length is the size on the wire
+        size = int(response.headers.get("Content-Length") or 0)
+    _trace_http(method, url, http_status, start_wall, duration, retries=max(0, attempts - 1), size=size)
+
+
+def _trace_http(method, url, http_status, start_wall, duration, retries: int = 0, size: int = 0):
+    parts = urllib.parse.urlsplit(url)
+    tracing.add(
+        f"http:{parts.hostname}",
+        start_wall,
+        duration,
+        "ok" if http_status is not None and http_status < 400 else "error",
+        method=method,
+        path=parts.path,
+        http_status=http_status,
+        retries=retries,
+        bytes=size
+    )
+
+
+@contextlib.contextmanager
+def traced(method: str, url: str):
+    """Trace one request made by another client (Drive, Gemini) like request() does
+
+    Set "status" (and optionally "bytes") on the yielded dict once the
+    response is in; a request that raises without one counts as an error.
+    """
+    call = {}
+    start_wall = time.time()
+    start = time.perf_counter()
+    try:
+        yield call
+    finally:
+        _trace_http(method, url, call.get("status"), start_wall, time.perf_counter() - start,
+                    size=call.get("bytes") or 0)
@@ -0,0 +1,74 @@
+import os
+import hashlib
+
+# =========================
+# TRANSFER INTEGRITY
+# =========================
+# Bytes are hashed and counted as they move, never in a separate pass
+# over the file, and compared with what the other side reports: the
+# source's Content-Length / Content-Range, Drive's size and md5Checksum.
+
+
+class IntegrityError(RuntimeError):
+    """Transferred bytes don't match what the other side reports; fetch the clip again"""
+
+
+class TransferHash:
+    """Running md5 and byte count of a transfer"""
+
+    def __init__(self):
+        self._md5 = hashlib.md5()
+        self.size = 0
+
+    def update(self, data: bytes):
+        self._md5.update(data)
+        self.size += len(data)
+
+    def hexdigest(self) -> str:
+        return self._md5.hexdigest()
+
+
+class HashingReader:
+    """File wrapper that hashes every byte the first time it is read
+
+    Resumable uploads seek back and re-read a chunk after a failed
+    request; bytes below the high-water mark are not hashed twice, so
+    the digest is the file's as long as reads move forward from 0.
+    """
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self.hash = TransferHash()
+
+    def read(self, size: int = -1) -> bytes:
+        start = self._file.tell()
+        data = self._file.read(size)
+        if start <= self.hash.size < start + len(data):
+            self.hash.update(data[self.hash.size - start:])
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+def verify(what: str, transferred: TransferHash, size=None, md5: str = None):
+    """Raise IntegrityError unless `transferred` matches the reported size / md5"""
+    if size is not None and int(size) != transferred.size:
+        raise IntegrityError(f"❌ {what}: {transferred.size} bytes transferred, {size} expected")
+    if md5 and md5 != transferred.hexdigest():
+        raise IntegrityError(f"❌ {what}: md5 {transferred.hexdigest()} does not match {md5}")
+
+
+def hash_file(path: str, read_size: int = 1024 * 1024) -> TransferHash:
+    """md5 and size of a local file, for dedupe lookups before anything is sent"""
+    transferred = TransferHash()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(read_size), b""):
+            transferred.update(chunk)
+    return transferred
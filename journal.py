@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+import datetime
+import threading
+
+# =========================
+# RUN JOURNAL
+# =========================
+# Per-scene progress is written to disk after every state change, so a
+# run that dies halfway can be rerun and pick up where it stopped:
+#
+#   submitted  -> generation_id known, render may still be in flight
+#   complete   -> video_url known
+#   downloaded -> clip file on local disk
+#   uploaded   -> drive_file_id known, nothing left to do
+#   failed     -> start this scene over on the next run
+
+STATES = ("submitted", "complete", "downloaded", "uploaded", "failed")
+
+
+def run_key_for(scenes) -> str:
+    """Identifies a run by its scene prompts; new prompts start a new journal"""
+    blob = json.dumps(scenes, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class RunJournal:
+    def __init__(self, path: str, run_key: str):
+        self.path = path
+        self.run_key = run_key
+        self._aliases = set()      # earlier keys of the same run (see rekey)
+        self._prompts = {}         # scene index -> prompt hash, once bound
+        self._lock = threading.Lock()
+        self._scenes = {}
+
+        data = self._load()
+        keys = {data.get("run_key"), *data.get("aliases", [])}
+        if run_key in keys:
+            self._aliases = keys - {run_key, None}
+            self._scenes = data.get("scenes", {})
+            if self._scenes:
+                print(f"📒 Resuming run {run_key} from journal ({len(self._scenes)} scenes tracked)")
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Ignoring unreadable run journal {self.path}: {e}")
+            return {}
+
+    def bind(self, idx: int, prompt: str):
+        """Tie scene `idx` to its prompt; an entry recorded for another prompt is dropped"""
+        digest = prompt_hash(prompt)
+        with self._lock:
+            self._prompts[str(idx)] = digest
+            entry = self._scenes.get(str(idx))
+            if entry and entry.get("prompt_hash", digest) != digest:
+                print(f"📒 Ignoring journal entry for scene {idx}: recorded for a different prompt")
+                del self._scenes[str(idx)]
+                self._save()
+
+    def get(self, idx: int) -> dict:
+        with self._lock:
+            return dict(self._scenes.get(str(idx), {}))
+
+    def update(self, idx: int, state: str, **fields):
+        if state not in STATES:
+            raise ValueError(f"Unknown journal state: {state}")
+
+        with self._lock:
+            entry = self._scenes.setdefault(str(idx), {})
+            if str(idx) in self._prompts:
+                entry["prompt_hash"] = self._prompts[str(idx)]
+            entry.update(fields)
+            entry["state"] = state
+            entry["updated_at"] = datetime.datetime.utcnow().isoformat()
+            self._save()
+
+    def rekey(self, run_key: str):
+        """Re-label the entries once the run's scenes are known (streamed prompts)
+
+        The old key stays an alias, so a rerun that streams again finds
+        the journal as well as one that reads prompts.json.
+        """
+        with self._lock:
+            self._aliases = (self._aliases | {self.run_key}) - {run_key}
+            self.run_key = run_key
+            self._save()
+
+    def _save(self):
+        # Write-then-rename so a crash mid-write never corrupts the journal
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"run_key": self.run_key, "aliases": sorted(self._aliases), "scenes": self._scenes},
+                f,
+                indent=2,
+                ensure_ascii=False
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
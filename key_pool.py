@@ -0,0 +1,76 @@
+import hashlib
+import threading
+from rate_limiter import TokenBucket
+
+# =========================
+# LEONARDO API KEY POOL
+# =========================
+# Every key is a separate account with its own concurrency and rate
+# limits, so each gets its own token buckets and in-flight counter. New
+# generations go to the key with the least load relative to what its
+# bucket currently allows; status polls must use the key that submitted
+# the generation, so the pool remembers which key owns each ID.
+
+
+def key_id(api_key: str) -> str:
+    """Short fingerprint that identifies a key in logs and the run journal"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class ApiKey:
+    def __init__(self, api_key: str, submit_rate: float, poll_rate: float):
+        self.id = key_id(api_key)
+        self.headers = {
+            "authorization": f"Bearer {api_key}",
+            "accept": "application/json",
+            "content-type": "application/json"
+        }
+        self.submit = TokenBucket(f"leonardo-submit[{self.id}]", submit_rate)
+        self.poll = TokenBucket(f"leonardo-poll[{self.id}]", poll_rate)
+        self.in_flight = 0
+
+    def load(self) -> float:
+        # One more render on this key, measured against its current pace
+        return (self.in_flight + 1) / self.submit.rate
+
+
+class KeyPool:
+    def __init__(self, api_keys, submit_rate: float, poll_rate: float):
+        if not api_keys:
+            raise ValueError("KeyPool needs at least one API key")
+        self.keys = [ApiKey(k, submit_rate, poll_rate) for k in dict.fromkeys(api_keys)]
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> ApiKey:
+        """Least-loaded key for a new generation; release() it when the render ends"""
+        with self._lock:
+            key = min(self.keys, key=ApiKey.load)
+            key.in_flight += 1
+            return key
+
+    def bind(self, gen_id: str, key: ApiKey):
+        with self._lock:
+            self._owners[gen_id] = key
+
+    def attach(self, gen_id: str, owner_id: str = None) -> ApiKey:
+        """Claim the key that submitted `gen_id` in an earlier run (by key_id)"""
+        with self._lock:
+            key = next((k for k in self.keys if k.id == owner_id), None)
+            if key is None:
+                if owner_id:
+                    print(f"⚠️ Key {owner_id} for generation {gen_id} is not in the pool, using {self.keys[0].id}")
+                key = self.keys[0]
+            key.in_flight += 1
+            self._owners[gen_id] = key
+            return key
+
+    def release(self, key: ApiKey, gen_id: str = None):
+        """The render on `key` is over (or its submit failed)"""
+        with self._lock:
+            key.in_flight = max(0, key.in_flight - 1)
+            self._owners.pop(gen_id, None)
+
+    def owner(self, gen_id: str) -> ApiKey:
+        with self._lock:
+            return self._owners.get(gen_id) or self.keys[0]
@@ -1,33 +1,60 @@
 import os
+import json
 import time
-import requests
-from uploader import upload_video_to_drive
-from prompt_generator import (
-    generate_initial_prompt,
-    generate_continuation_prompt
-)
+import itertools
+import threading
+import concurrent.futures
+import http_client
+import tracing
+import metrics_store
+from poller import StatusPoller, RenderTimeHistory, PollError
+from journal import RunJournal, run_key_for
+from clip_cache import ClipCache, cache_key
+from assembler import assemble_clips
+from pipeline import Pipeline, Stage, Retry
+from deadline import Deadline, DeadlineExceeded
+from rate_limiter import CreditBudget
+from key_pool import KeyPool
+from downloader import download_file, DownloadError, has_partial, discard
+from integrity import IntegrityError
+from uploader import upload_video_to_drive, stream_url_to_drive
 
 # =========================
 # CONFIG
 # =========================
 LEONARDO_API_KEY = os.getenv("LEONARDO_API_KEY")
+# Comma-separated keys of several accounts; LEONARDO_API_KEY joins the pool too
+LEONARDO_API_KEYS = [
+    k.strip()
+    for k in [LEONARDO_API_KEY or "", *os.getenv("LEONARDO_API_KEYS", "").split(",")]
+    if k.strip()
+]
 
-if not LEONARDO_API_KEY:
-    raise RuntimeError("❌ LEONARDO_API_KEY environment variable not set")
-
-GENERATE_URL = "https://cloud.leonardo.ai/api/rest/v1/generations-text-to-video"
-STATUS_URL = "https://cloud.leonardo.ai/api/rest/v1/generations/{}"
-
-HEADERS = {
-    "authorization": f"Bearer {LEONARDO_API_KEY}",
-    "accept": "application/json",
-    "content-type": "application/json"
-}
+LEONARDO_API_BASE = os.getenv("LEONARDO_API_BASE", "https://cloud.leonardo.ai/api/rest/v1")
+GENERATE_URL = f"{LEONARDO_API_BASE}/generations-text-to-video"
+STATUS_URL = f"{LEONARDO_API_BASE}/generations/{{}}"
 
 TOTAL_CLIPS = 7               # 7 × 4s ≈ 28s
 MAX_WAIT_SECONDS = 20 * 60    # 20 minutes
-POLL_INTERVAL = 25            # seconds (slightly faster)
+POLL_INTERVAL = 25            # seconds (fallback when no render history)
+MIN_POLL_INTERVAL = 5         # seconds, once a job is near its expected finish
+VIDEO_MODEL = "MOTION2"
 MAX_STATUS_ERRORS = 5         # tolerate temporary API issues
+MAX_CONCURRENT_CLIPS = int(os.getenv("MAX_CONCURRENT_CLIPS", "7"))  # 1 = one clip at a time
+STREAM_UPLOADS = os.getenv("STREAM_UPLOADS", "0") == "1"  # pipe MP4s to Drive, no temp file
+ASSEMBLE_FINAL = os.getenv("ASSEMBLE_FINAL", "1") == "1"  # stitch clips into one video
+FINAL_VIDEO_NAME = "final_video.mp4"
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "2"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", "2"))  # finished clips waiting per stage
+BATCH_MODE = os.getenv("BATCH_MODE", "0") == "1"  # every video in batch.json (prompt_generator.py batch) in one run
+STREAM_PROMPTS = os.getenv("STREAM_PROMPTS", "0") == "1"  # render scenes as Gemini streams them
+MAX_CLIP_ATTEMPTS = int(os.getenv("MAX_CLIP_ATTEMPTS", "3"))  # per scene, across all stages
+RUN_DEADLINE_SECONDS = int(os.getenv("RUN_DEADLINE_SECONDS", str(45 * 60)))  # whole run, retries included
+SUBMIT_RATE = float(os.getenv("LEONARDO_SUBMIT_RPS", "2"))   # generation requests/s ceiling, per key
+POLL_RATE = float(os.getenv("LEONARDO_POLL_RPS", "5"))       # status checks/s ceiling, per key
+CREDIT_BUDGET = float(os.getenv("LEONARDO_CREDIT_BUDGET", "0"))  # per run, 0 = unlimited
+CREDITS_PER_CLIP = float(os.getenv("LEONARDO_CREDITS_PER_CLIP", "25"))  # reserved until the API reports the cost
 
 OUTPUT_DIR = "ytauto"
 # Drive-aware output
@@ -38,6 +65,13 @@ OUTPUT_DIR1 = (
     else "ytauto"
 )
 PROMPT_FILE = os.path.join(OUTPUT_DIR1, "prompts.json")
+BATCH_FILE = os.path.join(OUTPUT_DIR1, "batch.json")
+RENDER_HISTORY_FILE = os.path.join(OUTPUT_DIR1, "render_times.json")
+RUN_JOURNAL_FILE = os.path.join(OUTPUT_DIR1, "run_journal.json")
+CLIP_CACHE_DIR = os.path.join(OUTPUT_DIR1, "clip_cache")
+TRACE_DIR = os.path.join(OUTPUT_DIR1, "traces")
+METRICS_DB = os.getenv("METRICS_DB", os.path.join(OUTPUT_DIR1, "metrics.db"))
+CLIP_CACHE_MAX_BYTES = int(os.getenv("CLIP_CACHE_MAX_MB", "2048")) * 1024 * 1024
 # =========================
 # HELPERS
 # =========================
@@ -60,16 +94,71 @@ def load_prompts():
     return scenes
 
 
+def load_theme():
+    """Theme recorded in prompts.json by prompt_generator, if any"""
+    try:
+        with open(PROMPT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("theme")
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def load_batch():
+    """(name, theme, scenes) for every video in batch.json"""
+    if not os.path.exists(BATCH_FILE):
+        raise RuntimeError(f"❌ batch.json not found at {BATCH_FILE}")
+
+    with open(BATCH_FILE, "r", encoding="utf-8") as f:
+        videos = json.load(f).get("videos")
+
+    if not isinstance(videos, list) or not videos:
+        raise RuntimeError("❌ batch.json contains no videos")
+
+    batch = []
+    for n, video in enumerate(videos, start=1):
+        scenes = video.get("scenes")
+        if not isinstance(scenes, list) or not scenes:
+            raise RuntimeError(f"❌ batch.json video {n} contains no valid scenes")
+        batch.append((video.get("name") or f"video{n}", video.get("theme"), scenes))
+
+    names = [name for name, _, _ in batch]
+    if len(set(names)) != len(names):
+        raise RuntimeError("❌ batch.json video names must be unique")
+
+    print(f"🧠 Loaded {len(batch)} videos, {sum(len(s) for _, _, s in batch)} scene prompts")
+    return batch
+
+
+class ClipError(RuntimeError):
+    """A clip step failed; `retryable` says whether another attempt could help"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def _is_retryable(error) -> bool:
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, ClipError):
+        return error.retryable
+    if isinstance(error, PollError):
+        return error.reason != "stopped"
+    # googleapiclient HttpError carries the response as `resp`
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status is not None:
+        return int(status) in http_client.RETRYABLE_STATUS
+    return True
+
+
+def _status_retryable(response) -> bool:
+    """Network errors, 429 and 5xx may pass; other 4xx (bad prompt, no credits, auth) won't"""
+    return response is None or response.status_code in http_client.RETRYABLE_STATUS
+
+
 def safe_request(method, url, **kwargs):
-    """Retry wrapper for transient network failures"""
-    for attempt in range(3):
-        try:
-            response = requests.request(method, url, **kwargs)
-            return response
-        except requests.RequestException as e:
-            print(f"⚠️ Network error (attempt {attempt + 1}/3): {e}")
-            time.sleep(2)
-    return None
+    """Retry wrapper for transient failures over the shared pooled session"""
+    return http_client.request(method, url, **kwargs)
 
 
 def extract_video_url(job: dict):
@@ -82,99 +171,178 @@ def extract_video_url(job: dict):
     return None
 
 
-def generate_video(prompt: str):
-    payload = {
-        "prompt": prompt,
-        "model": "MOTION2",
-        "isPublic": False
-    }
-
-    print("🚀 Requesting video generation...")
+def fetch_generation_status(gen_id: str):
+    """One status check; returns (job dict or None on failure, Retry-After)"""
+    # Single attempt: the poller reschedules failures itself (honouring
+    # Retry-After) instead of blocking the shared loop in a backoff sleep.
+    # The generation belongs to the account that submitted it
+    key = get_key_pool().owner(gen_id)
     response = safe_request(
-        "POST",
-        GENERATE_URL,
-        json=payload,
-        headers=HEADERS,
-        timeout=30
+        "GET",
+        STATUS_URL.format(gen_id),
+        headers=key.headers,
+        timeout=30,
+        max_attempts=1,
+        limiter=key.poll
     )
 
+    retry_after = http_client.parse_retry_after(response)
     if not response or response.status_code != 200:
-        print("❌ Generation request failed")
-        return None
+        return None, retry_after
 
-    try:
-        gen_id = response.json()["motionVideoGenerationJob"]["generationId"]
-    except Exception:
-        print("❌ Invalid generation response:", response.text)
-        return None
+    return response.json().get("generations_by_pk") or {}, retry_after
 
-    print(f"🆔 Generation ID: {gen_id}")
 
-    elapsed = 0
-    status_errors = 0
+_poller = None
+_poller_lock = threading.Lock()
 
-    while elapsed < MAX_WAIT_SECONDS:
-        status_response = safe_request(
-            "GET",
-            STATUS_URL.format(gen_id),
-            headers=HEADERS,
-            timeout=30
-        )
 
-        if not status_response or status_response.status_code != 200:
-            status_errors += 1
-            print(f"⚠️ Status check failed ({status_errors}/{MAX_STATUS_ERRORS})")
+def get_poller():
+    """Shared status poller for every in-flight generation"""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = StatusPoller(
+                fetch_generation_status,
+                interval=POLL_INTERVAL,
+                max_errors=MAX_STATUS_ERRORS,
+                max_wait=MAX_WAIT_SECONDS,
+                history=RenderTimeHistory(RENDER_HISTORY_FILE),
+                min_interval=MIN_POLL_INTERVAL
+            )
+        return _poller
 
-            if status_errors >= MAX_STATUS_ERRORS:
-                print("❌ Too many status failures, aborting job")
-                return None
 
-            time.sleep(POLL_INTERVAL)
-            continue
+_key_pool = None
+_credit_budget = None
+_limits_lock = threading.Lock()
 
-        status_errors = 0
-        job = status_response.json().get("generations_by_pk") or {}
-        status = job.get("status")
 
-        print(f"🔄 Status: {status}")
+def get_key_pool() -> KeyPool:
+    """Leonardo accounts, each with its own submit/poll rate limits"""
+    global _key_pool
+    with _limits_lock:
+        if _key_pool is None:
+            # Checked here rather than at import so the module loads without credentials
+            if not LEONARDO_API_KEYS:
+                raise RuntimeError("❌ LEONARDO_API_KEY environment variable not set")
+            _key_pool = KeyPool(LEONARDO_API_KEYS, SUBMIT_RATE, POLL_RATE)
+        return _key_pool
 
-        if status == "FAILED":
-            print("❌ Generation FAILED")
-            return None
 
-        if status == "COMPLETE":
-            video_url = extract_video_url(job)
-            if video_url:
-                print("🎥 Video URL resolved")
-                return video_url
+def get_credit_budget() -> CreditBudget:
+    global _credit_budget
+    with _limits_lock:
+        if _credit_budget is None:
+            _credit_budget = CreditBudget(CREDIT_BUDGET)
+        return _credit_budget
 
-            print("❌ COMPLETE but no video URL found")
-            print("🧪 Job payload:", job)
-            return None
 
-        time.sleep(POLL_INTERVAL)
-        elapsed += POLL_INTERVAL
+_clip_cache = None
+_clip_cache_lock = threading.Lock()
 
-    print("⏰ Generation timed out")
-    return None
 
+def get_clip_cache():
+    global _clip_cache
+    with _clip_cache_lock:
+        if _clip_cache is None:
+            _clip_cache = ClipCache(CLIP_CACHE_DIR, CLIP_CACHE_MAX_BYTES)
+        return _clip_cache
 
-def download_video(video_url: str, filepath: str):
-    print("📥 Downloading video...")
-    response = safe_request(
-        "GET",
-        video_url,
-        stream=True,
-        timeout=60
-    )
+
+def build_payload(prompt: str) -> dict:
+    return {
+        "prompt": prompt,
+        "model": VIDEO_MODEL,
+        "isPublic": False
+    }
+
+
+def submit_generation(prompt: str, label: str = "", deadline: Deadline = None):
+    """POST the generation request; returns the generation ID or raises ClipError"""
+    payload = build_payload(prompt)
+
+    budget = get_credit_budget()
+    if not budget.reserve(CREDITS_PER_CLIP):
+        print(f"{label}💳 Credit budget of {CREDIT_BUDGET:.0f} used up")
+        raise ClipError("Credit budget exhausted", retryable=False)
+
+    pool = get_key_pool()
+    key = pool.acquire()
+
+    print(f"{label}🚀 Requesting video generation (key {key.id})...")
+    try:
+        response = safe_request(
+            "POST",
+            GENERATE_URL,
+            json=payload,
+            headers=key.headers,
+            timeout=30,
+            deadline=deadline,
+            limiter=key.submit
+        )
+    except Exception:
+        budget.settle(CREDITS_PER_CLIP, 0)
+        pool.release(key)
+        raise
 
     if not response or response.status_code != 200:
-        raise RuntimeError("❌ Failed to download video")
+        budget.settle(CREDITS_PER_CLIP, 0)
+        pool.release(key)
+        status = response.status_code if response is not None else "no response"
+        print(f"{label}❌ Generation request failed ({status})")
+        raise ClipError(f"Generation request failed ({status})", _status_retryable(response))
 
-    with open(filepath, "wb") as f:
-        for chunk in response.iter_content(chunk_size=1024 * 1024):
-            if chunk:
-                f.write(chunk)
+    try:
+        job = response.json()["motionVideoGenerationJob"]
+        gen_id = job["generationId"]
+    except Exception:
+        pool.release(key)
+        print(f"{label}❌ Invalid generation response:", response.text)
+        raise ClipError("Invalid generation response", retryable=False)
+
+    budget.settle(CREDITS_PER_CLIP, job.get("apiCreditCost", CREDITS_PER_CLIP))
+    # Counts as in flight on `key` until wait_for_video() returns
+    pool.bind(gen_id, key)
+
+    print(f"{label}🆔 Generation ID: {gen_id}")
+    return gen_id
+
+
+def wait_for_video(gen_id: str, label: str = "", deadline: Deadline = None, submitted_at: float = None):
+    """Block until the shared poller resolves `gen_id`; returns the MP4 URL
+
+    `submitted_at` (time.time()) marks a re-attached generation. Raises
+    PollError when the job timed out or could not be checked, and
+    ClipError when it FAILED or finished without a usable URL.
+    """
+    expires = deadline.expires if deadline is not None else None
+    pool = get_key_pool()
+    try:
+        job = get_poller().track(gen_id, label, model=VIDEO_MODEL, deadline=expires,
+                                  submitted_at=submitted_at).result()
+    finally:
+        pool.release(pool.owner(gen_id), gen_id)
+    if job.get("status") == "FAILED":
+        raise ClipError("Generation FAILED")
+
+    video_url = extract_video_url(job)
+    if video_url:
+        print(f"{label}🎥 Video URL resolved")
+        return video_url
+
+    print(f"{label}❌ COMPLETE but no video URL found")
+    print(f"{label}🧪 Job payload:", job)
+    raise ClipError("COMPLETE but no video URL found", retryable=False)
+
+
+def download_video(video_url: str, filepath: str, label: str = "", deadline: Deadline = None):
+    print(f"{label}📥 Downloading video...")
+    try:
+        # Concurrent byte ranges; a retry resumes whatever is still missing
+        download_file(video_url, filepath, label, deadline)
+    except DownloadError as e:
+        raise ClipError(str(e), e.retryable)
 
 
 # =========================
@@ -217,33 +385,464 @@ def download_video(video_url: str, filepath: str):
 #             if os.path.exists(filename):
 #                 os.remove(filename)
 #                 print("🧹 Local cleanup complete")
-def main():
-    ensure_output_folder()
-    prompts = load_prompts()
+def resolve_video_url(idx: int, prompt: str, journal: RunJournal, label: str = "",
+                      deadline: Deadline = None):
+    """Video URL for a scene, re-attaching to any generation the journal knows about
+
+    Raises ClipError / PollError on failure. A generation that merely
+    could not be checked stays "submitted", so a retry re-attaches to it
+    instead of paying for a new render. So does one cut off by the run
+    deadline, for the next run to pick up.
+    """
+    entry = journal.get(idx)
+    state = entry.get("state")
+
+    if state in ("complete", "downloaded") and entry.get("video_url"):
+        print(f"{label}📒 Video URL already resolved in a previous run")
+        return entry["video_url"]
+
+    gen_id = entry.get("generation_id") if state == "submitted" else None
+    submitted_at = None
+    if gen_id:
+        print(f"{label}🔗 Re-attaching to generation {gen_id}")
+        get_key_pool().attach(gen_id, entry.get("key_id"))
+        # Journals written before submit times were kept: treat as just submitted
+        submitted_at = entry.get("submitted_at") or time.time()
+    else:
+        with tracing.span("submit", clip=idx):
+            gen_id = submit_generation(prompt, label, deadline)
+        journal.update(idx, "submitted", generation_id=gen_id, key_id=get_key_pool().owner(gen_id).id,
+                       submitted_at=time.time())
 
-    for idx, prompt in enumerate(prompts, start=1):
-        print(f"\n🎬 Clip {idx}/{len(prompts)}")
+    try:
+        with tracing.span("render", clip=idx, generation_id=gen_id):
+            video_url = wait_for_video(gen_id, label, deadline, submitted_at)
+    except PollError as e:
+        if deadline is not None:
+            deadline.check("render")
+        if e.reason != "errors":
+            journal.update(idx, "failed")
+        raise
+    except ClipError:
+        journal.update(idx, "failed")
+        raise
+
+    journal.update(idx, "complete", video_url=video_url)
+    return video_url
+
+
+def fetch_local_clip(key: str, video_url, filename: str, label: str = "", deadline: Deadline = None):
+    """Bring an already-uploaded clip back to disk for assembly"""
+    cached = get_clip_cache().lookup(key) or {}
+    if cached.get("file"):
+        get_clip_cache().materialize(cached, filename)
+        return
+
+    video_url = video_url or cached.get("video_url")
+    if not video_url:
+        raise RuntimeError("❌ No cached clip or URL to rebuild the local copy")
+    download_video(video_url, filename, label, deadline)
+
+
+class Video:
+    """One final video: its scenes, run journal and clip jobs"""
+
+    def __init__(self, scenes, theme: str = None, name: str = None, total: int = None, run_key: str = None):
+        # `name` is None for the classic one-video run, which keeps the
+        # original journal and file names
+        self.name = name
+        self.theme = theme
+        self.scenes = scenes
+        self.total = total or len(scenes)   # expected scenes, known before they stream in
+        journal_file = RUN_JOURNAL_FILE if name is None else os.path.join(OUTPUT_DIR1, f"run_journal_{name}.json")
+        self.journal = RunJournal(journal_file, run_key or run_key_for(scenes))
+        self.final_name = FINAL_VIDEO_NAME if name is None else f"final_{name}.mp4"
+        self.jobs = []
+
+
+class ClipJob:
+    """One scene's progress through the generate → download → upload stages"""
+
+    def __init__(self, video: Video, idx: int, prompt: str, deadline: Deadline):
+        self.video = video
+        self.journal = video.journal
+        self.journal.bind(idx, prompt)
+        self.idx = idx
+        self.total = video.total
+        self.prompt = prompt
+        if video.name:
+            self.label = f"[{video.name} clip {idx}] "
+            self.filename = os.path.join(OUTPUT_DIR, f"clip_{video.name}_{idx}.mp4")
+        else:
+            self.label = f"[clip {idx}] "
+            self.filename = os.path.join(OUTPUT_DIR, f"clip_{idx}.mp4")
+        self.key = cache_key(build_payload(prompt))
+        self.video_url = None
+        self.generation_id = None
+        self.reused_url = False      # video_url comes from the clip cache or an earlier run and may have expired
+        self.local_ready = False     # clip file already in place (cache hit / earlier run)
+        self.uploaded = False        # nothing left to upload (journal says done)
+        self.ok = False
+        self.attempts = 0            # failed attempts so far, across stages
+        self.deadline = deadline     # shared by every clip in the run
+        self.failure = None          # "<stage>: <error>" once the clip is given up
+
+
+def _keep_clips() -> bool:
+    return ASSEMBLE_FINAL and not STREAM_UPLOADS
+
+
+def _fail(job: ClipJob):
+    # The journal keeps the video URL, so the next run resumes the ranges already on disk
+    if job.video_url and has_partial(job.filename, job.video_url):
+        print(f"{job.label}💾 Keeping partial download for the next run")
+    elif os.path.exists(job.filename):
+        discard(job.filename)
+        print(f"{job.label}🧹 Local cleanup complete")
+    return None
 
-        filename = os.path.join(OUTPUT_DIR, f"clip_{idx}.mp4")
 
+def _retry_or_fail(job: ClipJob, stage: str, error, resume: str = None):
+    """Send the clip back to `resume` (default: the failed `stage`) while its attempt budget and the run deadline allow"""
+    resume = resume or stage
+    job.attempts += 1
+    print(f"{job.label}❌ Clip {job.idx} {stage} failed (attempt {job.attempts}/{MAX_CLIP_ATTEMPTS}):", error)
+
+    if isinstance(error, DeadlineExceeded) or job.deadline.expired():
+        print(f"{job.label}⏰ Run deadline reached, giving up")
+    elif not _is_retryable(error):
+        print(f"{job.label}🛑 Not retryable, giving up")
+    elif job.attempts >= MAX_CLIP_ATTEMPTS:
+        print(f"{job.label}🛑 Attempt budget used up, giving up")
+    else:
+        delay = http_client.backoff_delay(job.attempts)
+        print(f"{job.label}🔁 Retrying {resume} in {delay:.1f}s")
+        return Retry(job, resume, delay)
+
+    job.failure = f"{stage}: {error}"
+    return _fail(job)
+
+
+# Renders of a payload already being generated this run, by cache key.
+# A duplicate scene waits for the first one's video URL instead of
+# paying for a second render; the entry is dropped if that render fails.
+_renders = {}
+_renders_lock = threading.Lock()
+
+
+def _render_once(job: ClipJob, journal: RunJournal):
+    """(video_url, generation_id, reused) for the job, sharing one render per payload
+
+    `reused` is True when the URL was resolved by an earlier run.
+    """
+    with _renders_lock:
+        first = _renders.get(job.key)
+        if first is None:
+            owned = _renders[job.key] = concurrent.futures.Future()
+
+    if first is not None:
+        print(f"{job.label}⏳ Same scene is already rendering, waiting for it")
+        deadline = job.deadline
+        timeout = deadline.remaining() if deadline is not None and deadline.expires is not None else None
         try:
-            video_url = generate_video(prompt)
-            if not video_url:
-                print("⚠️ Skipping clip")
-                continue
+            video_url, generation_id, reused = first.result(timeout)
+        except concurrent.futures.TimeoutError:
+            deadline.check("render")
+            raise
+        journal.update(job.idx, "complete", video_url=video_url, generation_id=generation_id)
+        return video_url, generation_id, reused
+
+    earlier = journal.get(job.idx)
+    reused = earlier.get("state") in ("complete", "downloaded") and bool(earlier.get("video_url"))
+    try:
+        video_url = resolve_video_url(job.idx, job.prompt, journal, job.label, job.deadline)
+        generation_id = journal.get(job.idx).get("generation_id")
+    except BaseException as e:
+        with _renders_lock:
+            del _renders[job.key]
+        owned.set_exception(e)
+        raise
+    owned.set_result((video_url, generation_id, reused))
+    return video_url, generation_id, reused
+
+
+def _render_again(job: ClipJob, journal: RunJournal, error):
+    """A reused video URL no longer downloads: forget it and send the scene back to generate"""
+    print(f"{job.label}♻️ Earlier video URL is gone ({error}), rendering again")
+    get_clip_cache().forget(job.key)
+    journal.update(job.idx, "failed", video_url=None)
+    with _renders_lock:
+        first = _renders.get(job.key)
+        if first is not None and first.done() and not first.exception() and first.result()[0] == job.video_url:
+            del _renders[job.key]
+    discard(job.filename)
+    job.video_url = job.generation_id = None
+    job.reused_url = False       # a second failure is handled like any other
+    return Retry(job, "generate")
+
+
+def generate_stage(job: ClipJob, journal: RunJournal):
+    """Resolve a video URL (or a cached local clip) for the scene"""
+    retry = f" (attempt {job.attempts + 1}/{MAX_CLIP_ATTEMPTS})" if job.attempts else ""
+    of_video = f" of {job.video.name}" if job.video.name else ""
+    print(f"\n🎬 Clip {job.idx}/{job.total}{of_video}{retry}")
+    label = job.label
+
+    try:
+        entry = journal.get(job.idx)
+        if entry.get("state") == "uploaded":
+            print(f"{label}⏭️ Already uploaded (Drive ID {entry.get('drive_file_id')})")
+            job.uploaded = True
+            job.video_url = entry.get("video_url")
+            return job
+
+        cached = get_clip_cache().lookup(job.key)
+
+        if cached and cached.get("file") and not STREAM_UPLOADS:
+            print(f"{label}💾 Cache hit, skipping generation and download")
+            get_clip_cache().materialize(cached, job.filename)
+            job.local_ready = True
+            return job
+
+        if cached:
+            print(f"{label}💾 Cache hit, skipping generation")
+            job.video_url = cached["video_url"]
+            job.generation_id = cached.get("generation_id")
+            job.reused_url = True
+            return job
+
+        job.video_url, job.generation_id, job.reused_url = _render_once(job, journal)
+        return job
+
+    except Exception as e:
+        return _retry_or_fail(job, "generate", e)
 
-            download_video(video_url, filename)
-            upload_video_to_drive(filename)
 
-            print(f"✅ Clip {idx} uploaded")
+def download_stage(job: ClipJob, journal: RunJournal):
+    """Put the clip on local disk unless it streams straight to Drive"""
+    label = job.label
+
+    try:
+        if job.uploaded:
+            if _keep_clips() and not os.path.exists(job.filename):
+                fetch_local_clip(job.key, job.video_url, job.filename, label, job.deadline)
+            return job
+
+        if job.local_ready or STREAM_UPLOADS:
+            return job
+
+        if journal.get(job.idx).get("state") == "downloaded" and os.path.exists(job.filename):
+            print(f"{label}📒 Reusing clip downloaded in a previous run")
+        else:
+            with tracing.span("download", clip=job.idx) as span:
+                download_video(job.video_url, job.filename, label, job.deadline)
+                span["bytes"] = os.path.getsize(job.filename)
+            journal.update(job.idx, "downloaded")
+
+        get_clip_cache().store(job.key, job.video_url, job.generation_id, job.filename)
+        return job
+
+    except ClipError as e:
+        if job.reused_url and not e.retryable:
+            return _render_again(job, journal, e)
+        return _retry_or_fail(job, "download", e)
+
+    except Exception as e:
+        return _retry_or_fail(job, "download", e)
+
+
+def upload_stage(job: ClipJob, journal: RunJournal):
+    label = job.label
+
+    try:
+        if not job.uploaded:
+            if STREAM_UPLOADS:
+                with tracing.span("stream", clip=job.idx):
+                    file_id = stream_url_to_drive(
+                        job.video_url, os.path.basename(job.filename), label=label, deadline=job.deadline
+                    )
+                get_clip_cache().store(job.key, job.video_url, job.generation_id)
+            else:
+                with tracing.span("upload", clip=job.idx, bytes=os.path.getsize(job.filename)):
+                    file_id = upload_video_to_drive(job.filename, job.deadline)
+
+            journal.update(job.idx, "uploaded", drive_file_id=file_id)
+            print(f"{label}✅ Clip {job.idx} uploaded")
+
+        job.ok = True
+
+        # Clips are kept for assemble_final_video(), which removes them
+        if not _keep_clips() and os.path.exists(job.filename):
+            discard(job.filename)
+            print(f"{label}🧹 Local cleanup complete")
+        return job
+
+    except IntegrityError as e:
+        if STREAM_UPLOADS or not job.video_url:
+            # A streamed upload re-reads its source on retry; a cached clip has no URL to re-fetch
+            return _retry_or_fail(job, "upload", e)
+        # Fetch the clip again rather than re-sending bytes that may be bad on disk
+        discard(job.filename)
+        job.local_ready = False
+        return _retry_or_fail(job, "upload", e, resume="download")
+
+    except Exception as e:
+        return _retry_or_fail(job, "upload", e)
+
+
+def load_videos():
+    """Every video in batch.json in BATCH_MODE, else the one in prompts.json"""
+    if BATCH_MODE:
+        return [Video(scenes, theme, name) for name, theme, scenes in load_batch()]
+    return [Video(load_prompts(), load_theme())]
+
+
+def interleaved_jobs(videos, deadline: Deadline):
+    """Scene 1 of every video, then scene 2 of every video, ...
+
+    so all videos progress together through the shared pools and limiters.
+    """
+    for video in videos:
+        video.jobs = [ClipJob(video, idx, prompt, deadline) for idx, prompt in enumerate(video.scenes, start=1)]
+    return [job for group in itertools.zip_longest(*(v.jobs for v in videos)) for job in group if job]
+
+
+def streamed_video(deadline: Deadline):
+    """A video whose scenes come from a streaming Gemini call, and its job iterator"""
+    # Only this mode talks to Gemini (and needs GEMINI_API_KEY)
+    import prompt_generator
+
+    # The scenes aren't known yet, but the prompt set they come from is
+    video = Video([], total=prompt_generator.SCENE_COUNT,
+                  run_key=f"stream-{prompt_generator.prompt_set_key()}")
+    return video, _streamed_jobs(video, prompt_generator.stream_scene_prompts(), deadline)
+
+
+def _streamed_jobs(video: Video, scenes, deadline: Deadline):
+    """Yield a job per scene as it arrives, so rendering starts with scene 1"""
+    try:
+        for idx, prompt in enumerate(scenes, start=1):
+            deadline.check("prompt stream")
+            video.scenes.append(prompt)
+            job = ClipJob(video, idx, prompt, deadline)
+            video.jobs.append(job)
+            yield job
+    except Exception as e:
+        print(f"❌ Prompt stream stopped after {len(video.scenes)} scenes:", e)
+        return
+
+    # prompts.json now holds these scenes; key the journal the way a
+    # rerun from that file will look it up
+    video.journal.rekey(run_key_for(video.scenes))
+    video.theme = load_theme()
 
-        except Exception as e:
-            print(f"❌ Clip {idx} error:", e)
 
-        finally:
-            if os.path.exists(filename):
-                os.remove(filename)
-                print("🧹 Local cleanup complete")
+def main():
+    if STREAM_PROMPTS and BATCH_MODE:
+        # Streaming covers today's single video; a batch comes from batch.json
+        # (python prompt_generator.py batch)
+        raise RuntimeError("❌ STREAM_PROMPTS=1 cannot be combined with BATCH_MODE=1")
+    get_key_pool()    # fail fast on missing keys, before any prompt work
+    tracer = tracing.reset()
+    with tracer.span("run"):
+        ensure_output_folder()
+        # One deadline for every scene and every retry (and the prompt
+        # stream). Once it passes, every wait (HTTP, polling, transfers)
+        # stops at its next check and queued clips drain through as failures.
+        deadline = Deadline(RUN_DEADLINE_SECONDS)
+
+        if STREAM_PROMPTS:
+            video, jobs = streamed_video(deadline)
+            videos = [video]
+        else:
+            videos = load_videos()
+            jobs = interleaved_jobs(videos, deadline)
+
+        total, ok = run_pipeline(videos, jobs, deadline)
+
+    tracer.write(os.path.join(TRACE_DIR, f"run_{tracer.run_id}.jsonl"))
+    tracer.print_summary()
+
+    # A batch is recorded as one run under its combined themes
+    theme = "+".join(dict.fromkeys(v.theme for v in videos if v.theme)) or None
+    try:
+        metrics_store.record_run(tracer, theme, total, ok, METRICS_DB)
+    except Exception as e:
+        print("⚠️ Could not record run metrics:", e)
+
+
+def run_pipeline(videos, jobs, deadline: Deadline):
+    """Push `jobs` (a list, or an iterator that yields them as scenes arrive) through every stage"""
+    total = sum(video.total for video in videos)
+
+    # Scenes enter the pipeline as soon as they are known; the generate pool caps how
+    # many Leonardo jobs are rendering (and being polled) at the same time,
+    # while downloads and uploads of finished clips overlap with rendering.
+    generate_workers = max(1, min(MAX_CONCURRENT_CLIPS, total))
+    print(
+        f"⚡ Rendering {total} clips for {len(videos)} video(s), up to {generate_workers} at a time "
+        f"({DOWNLOAD_WORKERS} download / {UPLOAD_WORKERS} upload workers, "
+        f"{MAX_CLIP_ATTEMPTS} attempts per clip)"
+    )
+
+    Pipeline([
+        Stage("generate", lambda job: generate_stage(job, job.journal), generate_workers, total),
+        Stage("download", lambda job: download_stage(job, job.journal), DOWNLOAD_WORKERS, STAGE_QUEUE_SIZE),
+        Stage("upload", lambda job: upload_stage(job, job.journal), UPLOAD_WORKERS, STAGE_QUEUE_SIZE),
+    ]).run(jobs)
+
+    jobs = [job for video in videos for job in video.jobs]
+    results = [job.ok for job in jobs]
+
+    for video in videos:
+        print(f"\n📊 Clip results{f' for {video.name}' if video.name else ''}:")
+        for job in video.jobs:
+            reason = f" — {job.failure}" if not job.ok and job.failure else ""
+            print(f"  {'✅' if job.ok else '❌'} Clip {job.idx}{reason}")
+
+    recovered = sum(1 for job in jobs if job.ok and job.attempts)
+    print(f"🏁 {sum(results)}/{total} clips uploaded ({recovered} after retries)")
+
+    budget = get_credit_budget()
+    limit = f" of {budget.limit:.0f}" if budget.limit else ""
+    print(f"💳 {budget.spent:.0f}{limit} credits spent")
+
+    if deadline.expired():
+        print(
+            f"⏰ Run deadline of {RUN_DEADLINE_SECONDS}s reached with "
+            f"{total - sum(results)} clip(s) unfinished; renders still in flight "
+            f"stay in the run journal for the next run"
+        )
+
+    if _keep_clips():
+        for video in videos:
+            assemble_final_video(video)
+
+    return total, sum(results)
+
+
+def assemble_final_video(video: Video):
+    """Join the video's uploaded clips in scene order and upload the result"""
+    total = len(video.jobs)
+    clips = [job.filename for job in video.jobs if job.ok and os.path.exists(job.filename)]
+    output = os.path.join(OUTPUT_DIR, video.final_name)
+
+    if len(clips) < total:
+        print(f"⚠️ Assembling {video.final_name} with {len(clips)}/{total} clips")
+
+    try:
+        if clips:
+            with tracing.span("assemble", clips=len(clips)) as span:
+                span["method"] = assemble_clips(clips, output)
+            with tracing.span("upload", clip="final", bytes=os.path.getsize(output)):
+                upload_video_to_drive(output)
+            print(f"🎞️ Final video uploaded: {video.final_name}")
+    except Exception as e:
+        print("❌ Final video assembly failed:", e)
+    finally:
+        for path in clips + [output]:
+            discard(path)
+        print("🧹 Local cleanup complete")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+import os
+import sys
+import sqlite3
+import argparse
+import datetime
+import statistics
+
+# =========================
+# RUN HISTORY STORE
+# =========================
+# Every run appends its totals and per-stage timings (from the tracing
+# summary) to a local SQLite file. `python metrics_store.py report`
+# shows how render latency, upload throughput and failures trend by day
+# and by DAY_ROTATION theme.
+
+DEFAULT_DB = os.getenv("METRICS_DB", os.path.join("ytauto", "metrics.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id        TEXT PRIMARY KEY,
+    started_at    TEXT NOT NULL,
+    day           TEXT NOT NULL,
+    weekday       TEXT NOT NULL,
+    theme         TEXT,
+    clips_total   INTEGER NOT NULL,
+    clips_ok      INTEGER NOT NULL,
+    failures      INTEGER NOT NULL,   -- clips that did not make it to Drive
+    wall_s        REAL,
+    upload_bytes  INTEGER,
+    upload_s      REAL,
+    error_spans   INTEGER,            -- failed stage spans, retries included
+    http_errors   INTEGER             -- failed or >= 400 HTTP requests
+);
+CREATE TABLE IF NOT EXISTS stage_stats (
+    run_id   TEXT NOT NULL REFERENCES runs(run_id),
+    stage    TEXT NOT NULL,
+    count    INTEGER NOT NULL,
+    errors   INTEGER NOT NULL,
+    p50_s    REAL,
+    p95_s    REAL,
+    total_s  REAL,
+    PRIMARY KEY (run_id, stage)
+);
+"""
+
+
+def connect(path: str = DEFAULT_DB):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    return conn
+
+
+def _migrate(conn):
+    """Databases written before error spans were split out counted them as `failures`"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(runs)")}
+    if "error_spans" in columns:
+        return
+    with conn:
+        conn.execute("ALTER TABLE runs ADD COLUMN error_spans INTEGER")
+        conn.execute("ALTER TABLE runs ADD COLUMN http_errors INTEGER")
+        conn.execute("UPDATE runs SET error_spans = failures, failures = clips_total - clips_ok")
+
+
+def record_run(tracer, theme, clips_total: int, clips_ok: int, path: str = DEFAULT_DB):
+    """Append one run's totals and stage summary from a tracing.Tracer"""
+    spans = tracer.spans()
+    run_span = next((s for s in spans if s["name"] == "run"), None)
+    uploads = [s for s in spans if s["name"] in ("upload", "stream") and s["status"] == "ok"]
+
+    started = datetime.datetime.strptime(tracer.run_id, "%Y%m%dT%H%M%SZ")
+    errors = [s for s in spans if s["status"] != "ok"]
+    http_errors = sum(1 for s in errors if s["name"].startswith("http:"))
+
+    conn = connect(path)
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO runs (run_id, started_at, day, weekday, theme, clips_total, clips_ok, "
+            "failures, wall_s, upload_bytes, upload_s, error_spans, http_errors) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                tracer.run_id,
+                started.isoformat(),
+                started.date().isoformat(),
+                started.strftime("%A"),
+                theme,
+                clips_total,
+                clips_ok,
+                clips_total - clips_ok,
+                run_span["duration_s"] if run_span else None,
+                sum(s.get("bytes") or 0 for s in uploads),
+                sum(s["duration_s"] for s in uploads),
+                len(errors) - http_errors,
+                http_errors,
+            )
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO stage_stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(tracer.run_id, *row) for row in tracer.summary()]
+        )
+    conn.close()
+
+    print(f"🗄️ Run metrics appended to {path}")
+
+
+# =========================
+# REPORT
+# =========================
+def _mb_per_s(upload_bytes, upload_s):
+    return upload_bytes / upload_s / 1e6 if upload_s else None
+
+
+def _fmt(value, spec=".1f"):
+    return "-" if value is None else format(value, spec)
+
+
+def _trend(label: str, values):
+    """Compare the first and second half of a series, oldest first"""
+    values = [v for v in values if v is not None]
+    if len(values) < 4:
+        return False
+    half = len(values) // 2
+    before = statistics.median(values[:half])
+    after = statistics.median(values[half:])
+    if before:
+        change = (after - before) / before * 100
+        arrow = "📈" if change > 0 else "📉"
+        print(f"  {arrow} {label}: {before:.2f} → {after:.2f} ({change:+.0f}%)")
+    return True
+
+
+def report(days: int = 14, path: str = DEFAULT_DB):
+    since = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+
+    conn = connect(path)
+    with conn:
+        rows = conn.execute(
+            """
+            SELECT r.day, r.theme, r.clips_ok, r.clips_total, r.failures,
+                   r.wall_s, r.upload_bytes, r.upload_s,
+                   s.p50_s, s.p95_s, r.error_spans, r.http_errors
+            FROM runs r
+            LEFT JOIN stage_stats s ON s.run_id = r.run_id AND s.stage = 'render'
+            WHERE r.day >= ?
+            ORDER BY r.started_at
+            """,
+            (since,)
+        ).fetchall()
+    conn.close()
+
+    if not rows:
+        print(f"📭 No runs recorded in the last {days} days ({path})")
+        return
+
+    print(f"\n📅 Runs in the last {days} days")
+    print(f"{'day':<11} {'theme':<16} {'clips':>7} {'fail':>5} {'errs':>5} {'http':>5} {'wall s':>8} {'render p50':>11} {'p95':>7} {'upload MB/s':>12}")
+    for day, theme, ok, total, failures, wall, up_bytes, up_s, p50, p95, error_spans, http_errors in rows:
+        print(
+            f"{day:<11} {(theme or '-'):<16} {f'{ok}/{total}':>7} {failures:>5} "
+            f"{_fmt(error_spans, 'd'):>5} {_fmt(http_errors, 'd'):>5} "
+            f"{_fmt(wall):>8} {_fmt(p50):>11} {_fmt(p95):>7} {_fmt(_mb_per_s(up_bytes, up_s), '.2f'):>12}"
+        )
+
+    print("\n🎭 By theme")
+    by_theme = {}
+    for row in rows:
+        by_theme.setdefault(row[1] or "-", []).append(row)
+    print(f"{'theme':<16} {'runs':>5} {'success':>8} {'render p50':>11} {'upload MB/s':>12}")
+    for theme, theme_rows in sorted(by_theme.items()):
+        ok = sum(r[2] for r in theme_rows)
+        total = sum(r[3] for r in theme_rows)
+        p50s = [r[8] for r in theme_rows if r[8] is not None]
+        up_bytes = sum(r[6] or 0 for r in theme_rows)
+        up_s = sum(r[7] or 0 for r in theme_rows)
+        print(
+            f"{theme:<16} {len(theme_rows):>5} {f'{ok / total:.0%}' if total else '-':>8} "
+            f"{_fmt(statistics.median(p50s) if p50s else None):>11} {_fmt(_mb_per_s(up_bytes, up_s), '.2f'):>12}"
+        )
+
+    print("\n🔭 Trends (first half vs second half of the window)")
+    shown = [
+        _trend("render p50 s", [r[8] for r in rows]),
+        _trend("render p95 s", [r[9] for r in rows]),
+        _trend("upload MB/s", [_mb_per_s(r[6], r[7]) for r in rows]),
+        _trend("run wall s", [r[5] for r in rows]),
+    ]
+    if not any(shown):
+        print("  (needs at least 4 runs in the window)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline run history")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="trends by day and theme")
+    rep.add_argument("--days", type=int, default=14)
+
+    args = parser.parse_args(argv)
+    if args.command == "report":
+        report(args.days, args.db)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
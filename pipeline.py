@@ -0,0 +1,127 @@
+import time
+import queue
+import threading
+import tracing
+
+# =========================
+# STAGED PIPELINE
+# =========================
+# Each stage owns a worker pool and a bounded input queue. A stage hands
+# its output to the next stage's queue, blocking when that queue is full,
+# so a slow stage (e.g. upload) applies backpressure upstream instead of
+# letting finished work pile up in memory or on disk.
+#
+# A handler can also return Retry(item, stage) to send an item back into
+# an earlier (or its own) stage. The item stays outstanding, so the
+# pipeline keeps running until it either completes or is dropped.
+
+_STOP = object()
+
+
+class Retry:
+    def __init__(self, item, stage: str, delay: float = 0.0):
+        """Put `item` back on the queue of the stage named `stage` after `delay` seconds"""
+        self.item = item
+        self.stage = stage
+        self.delay = max(0.0, delay)
+
+
+class Stage:
+    def __init__(self, name: str, handler, workers: int = 1, queue_size: int = 1):
+        """`handler(item)` returns the item for the next stage, None to drop it, or a Retry"""
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self._cond = threading.Condition()
+        self._outstanding = 0
+        self._feeding = False
+
+    def run(self, items):
+        """Push `items` through every stage and wait until all have left the pipeline"""
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                t = threading.Thread(
+                    target=self._work,
+                    args=(index,),
+                    name=f"{stage.name}-{n + 1}",
+                    daemon=True
+                )
+                t.start()
+                threads.append(t)
+
+        with self._cond:
+            self._feeding = True
+
+        # `items` may be a generator that produces work while earlier
+        # items are already being processed
+        try:
+            for item in items:
+                with self._cond:
+                    self._outstanding += 1
+                self._put(0, item)
+        finally:
+            # Let what was fed finish even if the producer raised
+            with self._cond:
+                self._feeding = False
+                if self._outstanding == 0:
+                    self._stop_all()
+
+            for t in threads:
+                t.join()
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        is_last = index == len(self.stages) - 1
+
+        while True:
+            entry = stage.queue.get()
+            if entry is _STOP:
+                return
+
+            item, enqueued_wall, enqueued = entry
+            # Time spent waiting for a free worker in this stage
+            tracing.add(f"{stage.name}.queue", enqueued_wall, time.perf_counter() - enqueued)
+
+            try:
+                result = stage.handler(item)
+            except Exception as e:
+                print(f"❌ {stage.name} stage error:", e)
+                result = None
+
+            if isinstance(result, Retry):
+                self._retry(result)
+            elif result is None or is_last:
+                self._complete()
+            else:
+                self._put(index + 1, result)
+
+    def _put(self, index: int, item):
+        self.stages[index].queue.put((item, time.time(), time.perf_counter()))
+
+    def _retry(self, retry: Retry):
+        index = next(i for i, s in enumerate(self.stages) if s.name == retry.stage)
+        # Re-queue from a timer thread: a worker putting into its own full
+        # queue would block the very worker that has to drain it.
+        timer = threading.Timer(retry.delay, self._put, (index, retry.item))
+        timer.daemon = True
+        timer.start()
+
+    def _complete(self):
+        with self._cond:
+            self._outstanding -= 1
+            if self._outstanding == 0 and not self._feeding:
+                self._stop_all()
+
+    def _stop_all(self):
+        for stage in self.stages:
+            for _ in range(stage.workers):
+                # Queues are empty once nothing is outstanding; other
+                # workers drain sentinels as they go, so this won't stall.
+                stage.queue.put(_STOP)
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import threading
+import statistics
+from concurrent.futures import Future
+
+# =========================
+# MULTIPLEXED STATUS POLLER
+# =========================
+# One background thread polls every in-flight Leonardo generation instead
+# of each clip running its own sleep loop. Jobs that come due at the same
+# time are checked in the same tick, so N jobs cost one wakeup per tick
+# rather than N independent timers.
+
+
+# =========================
+# RENDER TIME HISTORY
+# =========================
+class RenderTimeHistory:
+    """Recent time-to-COMPLETE samples per model, persisted as JSON"""
+
+    def __init__(self, path: str, window: int = 20):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._samples = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ Ignoring unreadable render history {path}: {e}")
+
+    def eta(self, model: str):
+        """Median seconds to COMPLETE for `model`, or None without history"""
+        with self._lock:
+            samples = self._samples.get(model)
+            return statistics.median(samples) if samples else None
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            samples = self._samples.setdefault(model, [])
+            samples.append(round(seconds, 1))
+            del samples[:-self.window]
+
+            try:
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._samples, f, indent=2)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"⚠️ Could not save render history: {e}")
+
+
+# =========================
+# POLLER
+# =========================
+class PollError(RuntimeError):
+    """A tracked job ended without a final status; `reason` is "timeout", "errors" or "stopped" """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class _TrackedJob:
+    def __init__(self, gen_id: str, label: str, model, started: float, deadline: float):
+        self.gen_id = gen_id
+        self.label = label
+        self.model = model
+        self.started = started
+        self.deadline = deadline
+        self.next_due = started
+        self.errors = 0
+        # Whether the render time is known: a fresh submit, or a re-attached
+        # job seen unfinished (one that completed unobserved may have sat idle)
+        self.timed = True
+        self.future = Future()
+
+    def due_at(self) -> float:
+        # A deadline that falls before the next check ends the wait there
+        return min(self.next_due, self.deadline)
+
+
+class StatusPoller:
+    """Tracks many generation IDs and resolves a Future per ID
+
+    `check_status(gen_id)` must return `(job, retry_after)`: the
+    `generations_by_pk` job dict (None when the request failed) and the
+    server's Retry-After hint in seconds (or None). Each Future resolves
+    to the job dict once it is COMPLETE or FAILED, and raises PollError
+    on timeout, too many status errors or stop().
+
+    With a `history`, polling is ETA-driven: the first check is held off
+    until shortly before the model's typical render time, then checks
+    run every `min_interval` seconds, relaxing back to `interval` once a
+    job is well past its ETA. Without history, `interval` is used.
+    """
+
+    def __init__(self, check_status, interval: float, max_errors: int,
+                 max_wait: float, coalesce: float = 2.0,
+                 history: RenderTimeHistory = None, min_interval: float = 5.0,
+                 eta_lead: float = 0.85):
+        self.check_status = check_status
+        self.interval = interval
+        self.max_errors = max_errors
+        self.max_wait = max_wait
+        # Jobs due within this many seconds of a tick are checked in it too
+        self.coalesce = coalesce
+        self.history = history
+        self.min_interval = min_interval
+        # Fraction of the ETA to wait before the first status check
+        self.eta_lead = eta_lead
+
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    # ---------- PUBLIC API ----------
+    def track(self, gen_id: str, label: str = "", callback=None, model: str = None,
+              deadline: float = None, submitted_at: float = None) -> Future:
+        """Start polling `gen_id`; optional callback receives the Future when done
+
+        `deadline` (time.monotonic()) cuts the wait short of `max_wait`.
+        `submitted_at` (time.time()) is when a re-attached job was
+        submitted, so its ETA and recorded render time count from there.
+        """
+        now = time.monotonic()
+        expires = now + self.max_wait
+        if deadline is not None:
+            expires = min(expires, deadline)
+        started = now if submitted_at is None else now - max(0.0, time.time() - submitted_at)
+        job = _TrackedJob(gen_id, label, model, started, expires)
+        job.timed = submitted_at is None
+        job.next_due = now + self._next_delay(job, now)
+
+        if callback:
+            job.future.add_done_callback(callback)
+
+        with self._cond:
+            self._jobs[gen_id] = job
+            self._ensure_thread()
+            self._cond.notify()
+
+        return job.future
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+        if self._thread:
+            self._thread.join()
+
+    # ---------- INTERNALS ----------
+    def _next_delay(self, job: _TrackedJob, now: float, retry_after: float = None) -> float:
+        eta = self.history.eta(job.model) if self.history and job.model else None
+
+        if eta is None:
+            delay = self.interval
+        else:
+            elapsed = now - job.started
+            hold_until = eta * self.eta_lead
+            if elapsed < hold_until:
+                delay = max(self.min_interval, hold_until - elapsed)
+            elif elapsed < eta * 2:
+                delay = self.min_interval
+            else:
+                delay = self.interval
+
+        if retry_after:
+            delay = max(delay, retry_after)
+
+        return delay
+
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name="status-poller",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = time.monotonic()
+                    wake_at = min((j.due_at() for j in self._jobs.values()), default=None)
+                    if wake_at is not None and wake_at <= now:
+                        due = [
+                            j for j in self._jobs.values()
+                            if j.due_at() <= now + self.coalesce
+                        ]
+                        break
+                    self._cond.wait(None if wake_at is None else wake_at - now)
+
+                if self._stopped:
+                    pending = list(self._jobs.values())
+                    self._jobs.clear()
+                    break
+
+            # One tick: check every due job, outside the lock so new
+            # jobs can be registered while requests are in flight.
+            for job in due:
+                self._poll_once(job)
+
+        for job in pending:
+            job.future.set_exception(PollError("stopped", "Poller stopped"))
+
+    def _finish(self, job: _TrackedJob, result=None, error: PollError = None):
+        with self._cond:
+            self._jobs.pop(job.gen_id, None)
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def _poll_once(self, job: _TrackedJob):
+        label = job.label
+        now = time.monotonic()
+
+        if now >= job.deadline:
+            print(f"{label}⏰ Generation timed out")
+            self._finish(job, error=PollError("timeout", "Generation timed out"))
+            return
+
+        try:
+            result, retry_after = self.check_status(job.gen_id)
+        except Exception as e:
+            print(f"{label}⚠️ Status check error: {e}")
+            result, retry_after = None, None
+
+        if result is None:
+            job.errors += 1
+            print(f"{label}⚠️ Status check failed ({job.errors}/{self.max_errors})")
+
+            if job.errors >= self.max_errors:
+                print(f"{label}❌ Too many status failures, aborting job")
+                self._finish(job, error=PollError("errors", "Too many status check failures"))
+                return
+
+            job.next_due = time.monotonic() + max(self.interval, retry_after or 0)
+            return
+
+        job.errors = 0
+        status = result.get("status")
+        print(f"{label}🔄 Status: {status}")
+
+        if status == "FAILED":
+            print(f"{label}❌ Generation FAILED")
+            self._finish(job, result)
+            return
+
+        if status == "COMPLETE":
+            if self.history and job.model and job.timed:
+                self.history.record(job.model, time.monotonic() - job.started)
+            self._finish(job, result)
+            return
+
+        job.timed = True
+        now = time.monotonic()
+        job.next_due = now + self._next_delay(job, now, retry_after)
@@ -1,30 +1,97 @@
 import os
+import re
 import json
+import time
+import hashlib
 import datetime
-from google import genai
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import http_client
 
 # ---------- GEMINI ----------
-if not os.getenv("GEMINI_API_KEY"):
-    raise RuntimeError("❌ GEMINI_API_KEY is missing")
-
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# google.genai takes most of a second to import, so the SDK and the
+# client are only loaded once a prompt is actually requested
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            if not os.getenv("GEMINI_API_KEY"):
+                raise RuntimeError("❌ GEMINI_API_KEY is missing")
+
+            from google import genai
+            _client = genai.Client(
+                api_key=os.getenv("GEMINI_API_KEY"),
+                # Override to point at a local stand-in (see fake_servers.py)
+                http_options={"base_url": os.getenv("GEMINI_BASE_URL")} if os.getenv("GEMINI_BASE_URL") else None
+            )
+        return _client
+
+
+GEMINI_DEFAULT_URL = "https://generativelanguage.googleapis.com/"
+
+
+def _gemini_url(method: str) -> str:
+    base = os.getenv("GEMINI_BASE_URL") or GEMINI_DEFAULT_URL
+    return f"{base.rstrip('/')}/v1beta/models/{GEMINI_MODEL}:{method}"
+
+
+def _api_status(error):
+    # genai's APIError carries the HTTP status as `code`
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def _generate_content(contents, config):
+    """One generateContent call, traced as an http span"""
+    with http_client.traced("POST", _gemini_url("generateContent")) as call:
+        try:
+            response = get_client().models.generate_content(model=GEMINI_MODEL, contents=contents, config=config)
+        except Exception as e:
+            call["status"] = _api_status(e)
+            raise
+        call["status"] = 200
+    return response
+
+
+def _generate_content_stream(contents, config):
+    """Streamed generateContent chunks; the http span lasts until the last one"""
+    with http_client.traced("POST", _gemini_url("streamGenerateContent")) as call:
+        try:
+            for chunk in get_client().models.generate_content_stream(
+                model=GEMINI_MODEL, contents=contents, config=config
+            ):
+                call["status"] = 200
+                yield chunk
+        except Exception as e:
+            call["status"] = _api_status(e)
+            raise
 
 # ---------- PATH RESOLUTION ----------
-def get_output_paths():
+def _output_dir():
     # Preferred: Google Drive (Colab)
     drive_base = "/content/drive/MyDrive"
 
     if os.path.exists(drive_base):
-        output_dir = os.path.join(drive_base, "ytauto")
-    else:
-        # Fallback: local / CI
-        output_dir = "ytauto"
+        return os.path.join(drive_base, "ytauto")
+    # Fallback: local / CI
+    return "ytauto"
 
+
+def get_output_paths():
+    output_dir = _output_dir()
     os.makedirs(output_dir, exist_ok=True)
     return output_dir, os.path.join(output_dir, "prompts.json")
 
 
-OUTPUT_DIR, PROMPT_FILE = get_output_paths()
+# Created on first write, not at import
+OUTPUT_DIR = _output_dir()
+PROMPT_FILE = os.path.join(OUTPUT_DIR, "prompts.json")
+BATCH_FILE = os.path.join(OUTPUT_DIR, "batch.json")
 
 # ---------- THEME ----------
 DAY_ROTATION = {
@@ -37,17 +104,57 @@ DAY_ROTATION = {
     "Sunday": "light_recap"
 }
 
+def _theme_for(day: datetime.date):
+    return DAY_ROTATION.get(day.strftime("%A"), "cinematic_story")
+
+def _today():
+    return datetime.datetime.utcnow().date()
+
 def _today_theme():
-    return DAY_ROTATION.get(
-        datetime.datetime.utcnow().strftime("%A"),
-        "cinematic_story"
+    return _theme_for(_today())
+
+GEMINI_MODEL = "gemini-2.5-flash-lite"
+SCENE_COUNT = 7
+MAX_GEMINI_ATTEMPTS = 2        # re-ask once if the answer still doesn't parse
+
+PROMPT_CACHE_DIR = os.path.join(OUTPUT_DIR, "prompt_cache")
+PROMPT_CACHE_DAYS = 7          # older cache entries are pruned
+
+PROMPT_QUEUE_FILE = os.path.join(OUTPUT_DIR, "prompt_queue.json")
+PROMPT_QUEUE_TTL_DAYS = 14     # pre-generated entries older than this are dropped
+_queue_lock = threading.Lock()
+
+
+# Structured output: Gemini must answer with exactly this shape
+def _scene_list_schema():
+    from google.genai import types
+    return types.Schema(
+        type=types.Type.ARRAY,
+        items=types.Schema(type=types.Type.STRING),
+        min_items=SCENE_COUNT,
+        max_items=SCENE_COUNT
+    )
+
+
+def _generation_config(schema=None):
+    from google.genai import types
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=schema or types.Schema(
+            type=types.Type.OBJECT,
+            properties={"scenes": _scene_list_schema()},
+            required=["scenes"]
+        )
     )
 
 # ---------- PROMPT GENERATOR ----------
-def generate_scene_prompts():
-    theme = _today_theme()
+def _instruction(theme: str, variation: int = None) -> str:
+    variation_rule = (
+        f"- Variation {variation}: pick a different setting than other variations of this theme\n"
+        if variation else ""
+    )
 
-    instruction = f"""
+    return f"""
 You are creating prompts for an AI cinematic video.
 
 Goal:
@@ -67,38 +174,144 @@ Rules:
 - No explanations
 - Continuous cinematic flow
 - Different camera motion every scene
-
+{variation_rule}
 Output format (JSON only):
-[
-  "scene 1 prompt",
-  "scene 2 prompt",
-  "scene 3 prompt",
-  "scene 4 prompt",
-  "scene 5 prompt",
-  "scene 6 prompt",
-  "scene 7 prompt"
-]
+{{
+  "scenes": [
+    "scene 1 prompt",
+    "scene 2 prompt",
+    "scene 3 prompt",
+    "scene 4 prompt",
+    "scene 5 prompt",
+    "scene 6 prompt",
+    "scene 7 prompt"
+  ]
+}}
 """
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash-lite",
-        contents=instruction
-    )
 
-    if not response.candidates:
-        raise RuntimeError("❌ Gemini returned no output")
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
 
-    raw = response.candidates[0].content.parts[0].text.strip()
+def parse_scenes(raw: str):
+    """Scene list from Gemini's text: {"scenes": [...]} or a bare array, fences allowed"""
+    text = _FENCE.sub("", (raw or "").strip())
 
     try:
-        prompts = json.loads(raw)
+        data = json.loads(text)
     except json.JSONDecodeError:
-        raise RuntimeError(f"❌ Invalid JSON from Gemini:\n{raw}")
+        raise ValueError(f"Invalid JSON from Gemini:\n{raw}")
+
+    return _check_scenes(data.get("scenes") if isinstance(data, dict) else data)
+
 
-    if not isinstance(prompts, list) or len(prompts) != 7:
-        raise RuntimeError("❌ Gemini did not return exactly 7 prompts")
+def _check_scenes(scenes):
+    if not isinstance(scenes, list) or not all(isinstance(s, str) and s.strip() for s in scenes):
+        raise ValueError("Gemini did not return a list of scene prompts")
+    if len(scenes) != SCENE_COUNT:
+        raise ValueError(f"Gemini returned {len(scenes)} prompts instead of {SCENE_COUNT}")
 
+    return [s.strip() for s in scenes]
+
+
+# ---------- PROMPT CACHE ----------
+# Same theme + same day + same instruction = same prompts, so reruns and
+# retries skip the Gemini round trip.
+def _prompt_key(theme: str, instruction: str, day: datetime.date) -> str:
+    blob = "\n".join([day.isoformat(), theme, GEMINI_MODEL, instruction])
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def _cache_path(theme: str, instruction: str) -> str:
+    today = _today()
+    return os.path.join(PROMPT_CACHE_DIR, f"{today.isoformat()}_{_prompt_key(theme, instruction, today)}.json")
+
+
+def prompt_set_key(theme: str = None) -> str:
+    """Identifies today's scene set (date, theme, instruction) before any of it is generated"""
+    theme = theme or _today_theme()
+    return _prompt_key(theme, _instruction(theme), _today())
+
+
+def _cached_prompts(theme: str, instruction: str):
+    path = _cache_path(theme, instruction)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            scenes = json.load(f)["scenes"]
+    except (OSError, KeyError, json.JSONDecodeError):
+        return None
+
+    print(f"♻️ Reusing cached prompts for {theme} ({path})")
+    return scenes
+
+
+def _cache_prompts(theme: str, instruction: str, prompts):
+    os.makedirs(PROMPT_CACHE_DIR, exist_ok=True)
+    _write_json(_cache_path(theme, instruction), {"theme": theme, "scenes": prompts})
+
+    cutoff = time.time() - PROMPT_CACHE_DAYS * 86400
+    for name in os.listdir(PROMPT_CACHE_DIR):
+        old = os.path.join(PROMPT_CACHE_DIR, name)
+        try:
+            if os.path.getmtime(old) < cutoff:
+                os.remove(old)
+        except FileNotFoundError:
+            # Another thread's temp file, or pruned by it already
+            pass
+
+
+def _write_json(path: str, data):
+    # Temp name per process and thread: batch requests write concurrently
+    tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _stored_prompts(theme: str, instruction: str, variation: int = None):
+    """Today's prompts without a Gemini call: the cache, then the pre-generated queue"""
+    cached = _cached_prompts(theme, instruction)
+    if cached or variation:
+        return cached
+
+    queued = pop_queued_prompts(theme)
+    if queued:
+        # Reruns later today hit the cache once the entry has been popped
+        _cache_prompts(theme, instruction, queued)
+    return queued
+
+
+def _request_scene_prompts(theme: str, variation: int = None):
+    instruction = _instruction(theme, variation)
+    stored = _stored_prompts(theme, instruction, variation)
+    if stored:
+        return stored
+
+    for attempt in range(1, MAX_GEMINI_ATTEMPTS + 1):
+        response = _generate_content(instruction, _generation_config())
+
+        try:
+            prompts = parse_scenes(response.text)
+            break
+        except ValueError as e:
+            print(f"⚠️ {e} (attempt {attempt}/{MAX_GEMINI_ATTEMPTS})")
+            if attempt == MAX_GEMINI_ATTEMPTS:
+                raise RuntimeError(f"❌ {e}")
+
+    _cache_prompts(theme, instruction, prompts)
+    return prompts
+
+
+def generate_scene_prompts(theme: str = None):
+    theme = theme or _today_theme()
+    prompts = _request_scene_prompts(theme)
+    _write_prompts(theme, prompts)
+    return prompts
+
+
+def _write_prompts(theme: str, prompts):
     # ---------- WRITE / OVERWRITE ----------
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
     with open(PROMPT_FILE, "w", encoding="utf-8") as f:
         json.dump(
             {
@@ -112,7 +325,329 @@ Output format (JSON only):
         )
 
     print(f"✅ prompts.json written to: {PROMPT_FILE}")
-    return prompts
+
+
+# ---------- STREAMING ----------
+class SceneStreamParser:
+    """Pulls complete string items out of a JSON array as its text arrives
+
+    Anything before the array (```json fences, the {"scenes": key) is
+    ignored, and a scene is emitted as soon as its closing quote is seen.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._start = None      # index of the opening quote of the current string
+        self._escaped = False
+
+    def feed(self, text: str):
+        """Scenes completed by `text`"""
+        self._buffer += text
+        scenes = []
+
+        while self._pos < len(self._buffer):
+            ch = self._buffer[self._pos]
+
+            if self._start is not None:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    scenes.append(json.loads(self._buffer[self._start:self._pos + 1]))
+                    self._start = None
+            elif not self._in_array:
+                self._in_array = ch == "["
+            elif ch == '"':
+                self._start = self._pos
+            elif ch == "]":
+                self._in_array = False
+
+            self._pos += 1
+
+        # Drop consumed text, keeping any string still in progress
+        keep = self._start if self._start is not None else self._pos
+        self._buffer = self._buffer[keep:]
+        self._pos -= keep
+        if self._start is not None:
+            self._start = 0
+
+        return scenes
+
+
+def stream_scene_prompts(theme: str = None):
+    """Yield each scene prompt as soon as Gemini has streamed it
+
+    prompts.json is written once the full set has arrived, so later runs
+    (and the run journal) see the same scenes as a non-streaming run.
+    """
+    theme = theme or _today_theme()
+    instruction = _instruction(theme)
+
+    stored = _stored_prompts(theme, instruction)
+    if stored:
+        yield from stored
+        _write_prompts(theme, stored)
+        return
+
+    parser = SceneStreamParser()
+    prompts = []
+
+    for chunk in _generate_content_stream(instruction, _generation_config()):
+        for scene in parser.feed(chunk.text or ""):
+            prompts.append(scene)
+            print(f"🧠 Scene {len(prompts)} streamed")
+            yield scene
+
+    if len(prompts) != SCENE_COUNT:
+        raise RuntimeError(f"❌ Gemini streamed {len(prompts)} prompts instead of {SCENE_COUNT}")
+
+    _cache_prompts(theme, instruction, prompts)
+    _write_prompts(theme, prompts)
+
+
+# ---------- PRE-GENERATION QUEUE ----------
+# The week's themes are fixed by DAY_ROTATION, so scene sets for several
+# upcoming days can be fetched in one Gemini call ahead of time. Each day
+# gets its own entry in prompt_queue.json; the daily run pops today's and
+# never waits on Gemini.
+def _days_schema(count: int):
+    from google.genai import types
+    return types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "days": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "date": types.Schema(type=types.Type.STRING),
+                        "scenes": _scene_list_schema()
+                    },
+                    required=["date", "scenes"]
+                ),
+                min_items=count,
+                max_items=count
+            )
+        },
+        required=["days"]
+    )
+
+
+def _multi_day_instruction(days) -> str:
+    schedule = "\n".join(f"- {day.isoformat()} ({day.strftime('%A')}): theme {_theme_for(day)}" for day in days)
+
+    return f"""
+You are creating prompts for {len(days)} separate AI cinematic videos, one per day.
+
+Each video:
+- Total video length ≈ 30 seconds
+- 7 short cinematic scenes (≈4–5 seconds each)
+- SAME environment, SAME world, SAME mood within the video
+- Each scene must use a DIFFERENT camera angle or motion
+- A different environment from every other day
+
+Style: cinematic, highly detailed, smooth camera motion
+Topics: nature, travel, futuristic, epic aerial scenery
+
+Days:
+{schedule}
+
+Rules:
+- Return EXACTLY 7 prompts per day
+- Each prompt = ONE paragraph
+- No quotes
+- No explanations
+- Continuous cinematic flow
+- Different camera motion every scene
+
+Output format (JSON only):
+{{
+  "days": [
+    {{"date": "YYYY-MM-DD", "scenes": ["scene 1 prompt", "...", "scene 7 prompt"]}}
+  ]
+}}
+"""
+
+
+def _load_queue():
+    """Queued entries by ISO date, minus past days and expired entries"""
+    try:
+        with open(PROMPT_QUEUE_FILE, "r", encoding="utf-8") as f:
+            entries = json.load(f).get("days", {})
+    except (OSError, AttributeError, json.JSONDecodeError):
+        return {}
+
+    today = _today().isoformat()
+    now = datetime.datetime.utcnow().isoformat()
+    return {
+        day: entry for day, entry in entries.items()
+        if day >= today and entry.get("expires_at", "") > now
+    }
+
+
+def _save_queue(entries):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    _write_json(PROMPT_QUEUE_FILE, {"days": dict(sorted(entries.items()))})
+
+
+def pop_queued_prompts(theme: str = None):
+    """Take today's pre-generated scenes off the queue (None if there are none)"""
+    if not os.path.exists(PROMPT_QUEUE_FILE):
+        return None
+
+    theme = theme or _today_theme()
+    # Batch requests pop concurrently; the read-modify-write must not interleave
+    with _queue_lock:
+        entries = _load_queue()
+        entry = entries.get(_today().isoformat())
+        if not entry or entry.get("theme") != theme:
+            _save_queue(entries)
+            return None
+
+        del entries[_today().isoformat()]
+        _save_queue(entries)
+    print(f"📬 Using pre-generated prompts for {theme} ({len(entries)} days left in queue)")
+    return entry["scenes"]
+
+
+def pregenerate_prompts(days: int = 7, refill_below: int = None):
+    """Queue scene sets for the next `days` days with one Gemini call
+
+    Days already queued are skipped. With `refill_below`, nothing is
+    fetched while at least that many days are still queued.
+    """
+    entries = _load_queue()
+    if refill_below is not None and len(entries) >= refill_below:
+        print(f"📬 {len(entries)} days of prompts queued, nothing to pre-generate")
+        return entries
+
+    today = _today()
+    wanted = [
+        day for day in (today + datetime.timedelta(days=n) for n in range(1, days + 1))
+        if day.isoformat() not in entries
+    ]
+    if not wanted:
+        print(f"📬 Next {days} days already queued")
+        return entries
+
+    print(f"🧠 Pre-generating prompts for {len(wanted)} days (ONE Gemini call)...")
+    response = _generate_content(
+        _multi_day_instruction(wanted),
+        _generation_config(_days_schema(len(wanted)))
+    )
+
+    try:
+        answer = json.loads(_FENCE.sub("", (response.text or "").strip()))["days"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        raise RuntimeError(f"❌ Invalid JSON from Gemini:\n{response.text}")
+
+    now = datetime.datetime.utcnow()
+    expires_at = (now + datetime.timedelta(days=PROMPT_QUEUE_TTL_DAYS)).isoformat()
+    wanted_dates = {day.isoformat(): day for day in wanted}
+    fresh = {}
+
+    for item in answer:
+        day = wanted_dates.pop(str(item.get("date")), None) if isinstance(item, dict) else None
+        if day is None:
+            continue
+        try:
+            scenes = _check_scenes(item.get("scenes"))
+        except ValueError as e:
+            # That day falls back to a regular call on the day itself
+            print(f"⚠️ {day.isoformat()}: {e}")
+            continue
+        fresh[day.isoformat()] = {
+            "theme": _theme_for(day),
+            "scenes": scenes,
+            "generated_at": now.isoformat(),
+            "expires_at": expires_at
+        }
+
+    for missing in wanted_dates:
+        print(f"⚠️ Gemini returned no prompts for {missing}")
+
+    # Merge into the queue as it is now, not as it was before the Gemini call
+    with _queue_lock:
+        entries = _load_queue()
+        entries.update(fresh)
+        _save_queue(entries)
+    print(f"✅ prompt_queue.json written to: {PROMPT_QUEUE_FILE} ({len(entries)} days queued)")
+    return entries
+
+
+# ---------- BATCH ----------
+def generate_batch_prompts(themes=None, variations: int = 1):
+    """Scene prompts for several videos in one manifest (read by main.py in BATCH_MODE)
+
+    Each theme (default: today's) gets `variations` videos with
+    different settings. The Gemini calls run concurrently.
+    """
+    themes = themes or [_today_theme()]
+    specs = [
+        (theme, v if variations > 1 else None)
+        for theme in themes
+        for v in range(1, variations + 1)
+    ]
+
+    with ThreadPoolExecutor(max_workers=len(specs)) as executor:
+        results = list(executor.map(lambda spec: _request_scene_prompts(*spec), specs))
+
+    videos = [
+        {
+            "name": f"{theme}_v{variation}" if variation else theme,
+            "theme": theme,
+            "scenes": prompts
+        }
+        for (theme, variation), prompts in zip(specs, results)
+    ]
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with open(BATCH_FILE, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "generated_at": datetime.datetime.utcnow().isoformat(),
+                "videos": videos
+            },
+            f,
+            indent=2,
+            ensure_ascii=False
+        )
+
+    print(f"✅ batch.json written to: {BATCH_FILE} ({len(videos)} videos)")
+    return videos
+
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gemini scene prompts")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("today", help="write today's prompts.json")
+
+    pregenerate = commands.add_parser("pregenerate", help="queue prompts for upcoming days in one call")
+    pregenerate.add_argument("--days", type=int, default=7)
+    pregenerate.add_argument("--refill-below", type=int, help="skip while at least this many days are queued")
+
+    batch = commands.add_parser("batch", help="write batch.json for a BATCH_MODE run of main.py")
+    batch.add_argument("themes", nargs="*", help="default: today's theme")
+    batch.add_argument("--variations", type=int, default=1, help="videos per theme")
+
+    args = parser.parse_args(argv)
+    if args.command == "pregenerate":
+        pregenerate_prompts(args.days, args.refill_below)
+    elif args.command == "batch":
+        if args.variations < 1:
+            parser.error("--variations must be at least 1")
+        generate_batch_prompts(args.themes, args.variations)
+    else:
+        generate_scene_prompts()
+
+
+if __name__ == "__main__":
+    main()
 
 
 
@@ -0,0 +1,103 @@
+import time
+import threading
+
+# =========================
+# RATE LIMITS & CREDITS
+# =========================
+# Token buckets pace each kind of Leonardo call (submits, status polls)
+# independently. A bucket starts at its configured ceiling, halves its
+# rate when the server answers 429 and creeps back up on every success
+# (AIMD), so a run settles just under whatever limit the account has
+# instead of bouncing off it.
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate: float, burst: float = None,
+                 min_rate: float = None, decrease: float = 0.5, increase: float = None):
+        """`rate` requests/s ceiling; `burst` tokens may be spent back to back"""
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.decrease = decrease
+        # Additive step per successful request
+        self.increase = increase if increase is not None else rate / 20
+
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_cut = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, deadline=None) -> float:
+        """Block until a request may go out; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+
+            if deadline is not None:
+                deadline.check(f"{self.name} rate limit")
+                wait = min(wait, deadline.remaining())
+
+            time.sleep(wait)
+            waited += wait
+
+    def throttle(self, retry_after: float = None):
+        """The server said 429: back off multiplicatively and pause for Retry-After"""
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self._tokens = 0.0
+            self._updated = now
+
+            # One cut per round trip: a burst of 429s from requests that
+            # were already in flight is one signal, not several
+            if now - self._last_cut < 1.0:
+                return
+            self._last_cut = now
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+
+        print(f"🚦 {self.name} throttled to {self.rate:.2f} req/s")
+
+    def relax(self):
+        """A request went through: raise the rate back towards the ceiling"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class CreditBudget:
+    """Credits a run may spend; 0 or None means no limit"""
+
+    def __init__(self, limit: float = None):
+        self.limit = limit or None
+        self.spent = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, cost: float) -> bool:
+        """Hold `cost` credits before submitting; False when it would overspend"""
+        with self._lock:
+            if self.limit is not None and self.spent + cost > self.limit:
+                return False
+            self.spent += cost
+            return True
+
+    def settle(self, reserved: float, actual: float):
+        """Replace a reservation with what the API reported (0 to release it)"""
+        with self._lock:
+            self.spent += actual - reserved
+
+    def remaining(self):
+        with self._lock:
+            return None if self.limit is None else max(0.0, self.limit - self.spent)
@@ -1,113 +1,18 @@
-import os
-import json
-import datetime
-from google import genai
+from prompt_generator import generate_scene_prompts, PROMPT_FILE
 from uploader import upload_file_to_drive  # must support overwrite
 
-# =========================
-# CONFIG
-# =========================
-OUTPUT_DIR = "ytauto"
-PROMPT_FILE = os.path.join(OUTPUT_DIR, "prompts.json")
-TOTAL_SCENES = 7
-
-# =========================
-# ENV CHECK
-# =========================
-if not os.getenv("GEMINI_API_KEY"):
-    raise RuntimeError("❌ GEMINI_API_KEY is missing")
-
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-
-# =========================
-# THEME ROTATION
-# =========================
-DAY_ROTATION = {
-    "Monday": "facts_explainer",
-    "Tuesday": "did_you_know",
-    "Wednesday": "myth_vs_reality",
-    "Thursday": "poll_opinion",
-    "Friday": "listicle",
-    "Saturday": "curiosity_loop",
-    "Sunday": "light_recap"
-}
-
-def today_theme():
-    return DAY_ROTATION.get(
-        datetime.datetime.utcnow().strftime("%A"),
-        "cinematic_story"
-    )
-
 # =========================
 # GEMINI (ONE CALL)
 # =========================
-def generate_scene_prompts():
-    theme = today_theme()
-
-    instruction = f"""
-Generate {TOTAL_SCENES} cinematic AI video prompts
-that together form ONE seamless story (~30 seconds total).
-
-Theme: {theme}
-Style: cinematic, hyper-realistic, 4K, smooth camera motion
-Topics: nature, travel, futuristic, epic aerial scenery
-
-Rules:
-- Same environment & mood across all scenes
-- Each scene uses a DIFFERENT camera angle or motion
-- Each scene = ONE paragraph
-- No numbering
-- No quotes
-- No explanations
-
-Return ONLY valid JSON:
-
-{{
-  "scenes": [
-    "scene text 1",
-    "scene text 2",
-    "scene text 3",
-    "scene text 4",
-    "scene text 5",
-    "scene text 6",
-    "scene text 7"
-  ]
-}}
-"""
-
-    response = client.models.generate_content(
-        model="gemini-2.5-flash-lite",
-        contents=instruction
-    )
-
-    text = response.candidates[0].content.parts[0].text
-    data = json.loads(text)
-
-    scenes = data.get("scenes", [])
-    if len(scenes) != TOTAL_SCENES:
-        raise RuntimeError("❌ Gemini did not return 7 scenes")
-
-    return scenes
+# Prompt generation lives in prompt_generator (schema-constrained JSON,
+# cached per theme and day); this script only runs it and publishes the
+# result.
 
 # =========================
-# SAVE + DRIVE UPLOAD
+# DRIVE UPLOAD
 # =========================
-def save_and_upload(prompts):
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-    payload = {
-        "generated_at": datetime.datetime.utcnow().isoformat(),
-        "scene_count": len(prompts),
-        "scenes": prompts
-    }
-
-    # overwrite local file
-    with open(PROMPT_FILE, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
-
-    print("💾 prompts.json saved locally")
-
-    # upload & overwrite in Drive
+def upload_prompts():
+    # prompts.json is (over)written locally by generate_scene_prompts()
     upload_file_to_drive(PROMPT_FILE)
     print("☁️ prompts.json uploaded to Google Drive (overwrite)")
 
@@ -121,7 +26,7 @@ def main():
     for i, p in enumerate(prompts, 1):
         print(f"\n🎬 Scene {i}:\n{p}")
 
-    save_and_upload(prompts)
+    upload_prompts()
     print("\n✅ FULL TEST SUCCESS")
 
 if __name__ == "__main__":
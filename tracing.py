@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import datetime
+import threading
+import contextlib
+
+# =========================
+# RUN TRACE
+# =========================
+# Lightweight spans for every pipeline stage and HTTP call. Recording a
+# span is a perf_counter pair and a list append under a lock, so it is
+# cheap enough for the hot path; TRACE=0 turns it into a no-op.
+#
+# Each span: {"name", "start", "duration_s", "status", ...attrs}
+# ("start" is wall-clock epoch seconds, attrs are e.g. clip, bytes,
+# http_status, retries).
+
+TRACE_ENABLED = os.getenv("TRACE", "1") == "1"
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Tracer:
+    def __init__(self, enabled: bool = TRACE_ENABLED):
+        self.enabled = enabled
+        self.run_id = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, duration: float, status: str = "ok", **attrs):
+        if not self.enabled:
+            return
+        record = {
+            "name": name,
+            "start": round(start, 3),
+            "duration_s": round(duration, 4),
+            "status": status,
+            **attrs
+        }
+        with self._lock:
+            self._spans.append(record)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        """Time a block; the yielded dict collects extra attrs (set "status" to override)"""
+        if not self.enabled:
+            yield attrs
+            return
+
+        start_wall = time.time()
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield attrs
+        except BaseException as e:
+            status = "error"
+            attrs.setdefault("error", str(e)[:200])
+            raise
+        finally:
+            status = attrs.pop("status", status)
+            self.add(name, start_wall, time.perf_counter() - start, status, **attrs)
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def write(self, path: str):
+        """One JSON object per line; the first line describes the run"""
+        if not self.enabled:
+            return
+        records = self.spans()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"run_id": self.run_id, "spans": len(records)}) + "\n")
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"🧾 Trace written to {path}")
+
+    def summary(self):
+        """[(name, count, errors, p50, p95, total)] sorted by total time"""
+        grouped = {}
+        for record in self.spans():
+            grouped.setdefault(record["name"], []).append(record)
+
+        rows = []
+        for name, records in grouped.items():
+            durations = sorted(r["duration_s"] for r in records)
+            errors = sum(1 for r in records if r["status"] != "ok")
+            rows.append((
+                name,
+                len(records),
+                errors,
+                _percentile(durations, 50),
+                _percentile(durations, 95),
+                sum(durations)
+            ))
+        return sorted(rows, key=lambda row: row[5], reverse=True)
+
+    def print_summary(self):
+        rows = self.summary()
+        if not rows:
+            return
+        print(f"\n⏱️ {'stage':<20} {'count':>6} {'errors':>7} {'p50 s':>8} {'p95 s':>8} {'total s':>9}")
+        for name, count, errors, p50, p95, total in rows:
+            print(f"   {name:<20} {count:>6} {errors:>7} {p50:>8.2f} {p95:>8.2f} {total:>9.2f}")
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def reset() -> Tracer:
+    """Start a fresh trace (one per run)"""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def span(name: str, **attrs):
+    return _tracer.span(name, **attrs)
+
+
+def add(name: str, start: float, duration: float, status: str = "ok", **attrs):
+    _tracer.add(name, start, duration, status, **attrs)
@@ -1,24 +1,25 @@
 import os
 import json
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+import time
+import datetime
+import threading
+import http_client
+from integrity import IntegrityError, HashingReader, TransferHash, verify, hash_file
+
+# google-auth, googleapiclient and requests are imported where they are
+# used: together they cost ~300 ms, which callers that never upload
+# (CLI help, dry runs, prompt generation) shouldn't pay
 
 SCOPES = ["https://www.googleapis.com/auth/drive"]
 DRIVE_FOLDER_NAME = "ytauto"
+TOKEN_REFRESH_MARGIN = 5 * 60         # refresh when the token expires within this many seconds
 
-
-def get_drive_service():
-    creds = Credentials.from_authorized_user_info(
-        json.loads(os.environ["GOOGLE_TOKEN"]),
-        SCOPES
-    )
-
-    if creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-
-    return build("drive", "v3", credentials=creds)
+DEFAULT_DRIVE_API_ROOT = "https://www.googleapis.com"
+DRIVE_API_ROOT = os.getenv("DRIVE_API_ROOT", DEFAULT_DRIVE_API_ROOT)
+DRIVE_UPLOAD_URL = f"{DRIVE_API_ROOT}/upload/drive/v3/files"
+STREAM_CHUNK_SIZE = 8 * 1024 * 1024   # must be a multiple of 256 KiB
+SOURCE_READ_SIZE = 1024 * 1024
+MAX_STREAM_RETRIES = 5                # per transfer, source and upload side
 
 
 def get_or_create_folder(service, folder_name):
@@ -53,69 +54,562 @@ def get_or_create_folder(service, folder_name):
     return folder["id"]
 
 
-def upload_video_to_drive(filename):
-    service = get_drive_service()
+class _TracedHttp:
+    """httplib2-style transport that traces every googleapiclient request
 
-    # ✅ Ensure ytauto folder exists
-    folder_id = get_or_create_folder(service, DRIVE_FOLDER_NAME)
+    Covers list / create / copy / delete calls and each next_chunk() PUT
+    of a resumable upload, one http span per request.
+    """
 
-    media = MediaFileUpload(
-        filename,
-        mimetype="video/mp4",
-        resumable=True
-    )
+    def __init__(self, http):
+        self._http = http
 
-    file_metadata = {
-        "name": os.path.basename(filename),
-        "parents": [folder_id]
-    }
+    def request(self, uri, method="GET", *args, **kwargs):
+        with http_client.traced(method, uri) as call:
+            resp, content = self._http.request(uri, method, *args, **kwargs)
+            call["status"] = resp.status
+            call["bytes"] = len(content or b"")
+        return resp, content
 
-    file = service.files().create(
-        body=file_metadata,
-        media_body=media,
-        fields="id"
-    ).execute()
+    def __getattr__(self, name):
+        return getattr(self._http, name)
 
-    print("📤 Drive file ID:", file["id"])
 
-def upload_file_to_drive(filepath):
-    service = get_drive_service()
+class _TracedSession:
+    """AuthorizedSession wrapper that traces every request, like http_client.request()"""
 
-    # ✅ Ensure ytauto folder exists
-    folder_id = get_or_create_folder(service, DRIVE_FOLDER_NAME)
-    filename = os.path.basename(filepath)
+    def __init__(self, session):
+        self._session = session
 
-    # 🔍 Check if file already exists in Drive folder
-    query = f"name='{filename}' and '{folder_id}' in parents and trashed=false"
-    results = service.files().list(
-        q=query,
-        fields="files(id)"
-    ).execute()
+    def request(self, method, url, **kwargs):
+        with http_client.traced(method, url) as call:
+            response = self._session.request(method, url, **kwargs)
+            call["status"] = response.status_code
+            call["bytes"] = int(response.headers.get("Content-Length") or 0)
+        return response
 
-    files = results.get("files", [])
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
 
-    media = MediaFileUpload(filepath, resumable=True)
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+def _build_drive(creds):
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient import discovery_cache
+    from googleapiclient.discovery import build, build_from_document
+    from googleapiclient.http import build_http
+
+    http = _TracedHttp(AuthorizedHttp(creds, http=build_http()))
+    if DRIVE_API_ROOT == DEFAULT_DRIVE_API_ROOT:
+        return build("drive", "v3", http=http, cache_discovery=False)
+
+    # api_endpoint alone leaves media uploads on the https Google host,
+    # so rebase the bundled discovery document instead
+    doc = json.loads(discovery_cache.get_static_doc("drive", "v3"))
+    doc["rootUrl"] = DRIVE_API_ROOT.rstrip("/") + "/"
+    return build_from_document(doc, http=http)
+
+
+def _is_not_found(error) -> bool:
+    import requests
+    from googleapiclient.errors import HttpError
+
+    if isinstance(error, HttpError):
+        return error.resp.status == 404
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 404
+    return False
+
+
+# =========================
+# STREAMING HELPERS
+# =========================
+def _open_source(url: str, start: int, deadline=None):
+    """(declared file size or None, chunk iterator over `url` from byte `start`)
+
+    Uses Range when the server supports it.
+    """
+    headers = {"Range": f"bytes={start}-"} if start else {}
+    response = http_client.request("GET", url, headers=headers, stream=True, timeout=60, deadline=deadline)
+
+    if response is None or response.status_code not in (200, 206):
+        raise RuntimeError(f"❌ Source download failed at byte {start}")
+
+    return http_client.declared_size(response), _source_chunks(response, start)
+
+
+def _source_chunks(response, start: int):
+    chunks = response.iter_content(chunk_size=SOURCE_READ_SIZE)
+    if start and response.status_code == 200:
+        # Server ignored Range: skip what we already have
+        skip = start
+        for chunk in chunks:
+            if len(chunk) > skip:
+                yield chunk[skip:]
+                break
+            skip -= len(chunk)
+
+    yield from chunks
+
+
+def _confirmed_offset(response) -> int:
+    """Bytes Drive has persisted, from a 308 response's Range header"""
+    value = response.headers.get("Range")
+    if not value:
+        return 0
+    return int(value.rsplit("-", 1)[1]) + 1
+
+
+def _query_status(session, session_uri: str, total):
+    """Ask Drive how much of an interrupted upload it has persisted"""
+    import requests
+
+    for attempt in range(MAX_STREAM_RETRIES):
+        try:
+            return session.put(
+                session_uri,
+                headers={"Content-Range": f"bytes */{total or '*'}"},
+                timeout=60
+            )
+        except requests.RequestException:
+            if attempt + 1 >= MAX_STREAM_RETRIES:
+                raise
+            time.sleep(http_client.backoff_delay(attempt))
+
+
+# =========================
+# DRIVE UPLOADER
+# =========================
+class DriveUploader:
+    """Long-lived Drive client shared by every upload in a run
+
+    Credentials are parsed once and refreshed only when close to expiry.
+    The discovery client and authorized session are cached per thread
+    (googleapiclient objects are not thread-safe), and the target folder
+    ID is memoized until an upload reports it missing.
+
+    The folder's files are listed once, with md5Checksum and size, into
+    an in-memory index. Uploads whose bytes are already there are skipped
+    (same name) or copied server-side (different name), so reruns and
+    retries send almost nothing.
+    """
+
+    def __init__(self, folder_name: str = DRIVE_FOLDER_NAME):
+        self.folder_name = folder_name
+        self._creds = None
+        self._folder_id = None
+        self._index = None          # file ID -> {id, name, md5Checksum, size}
+        self._lock = threading.Lock()
+        self._folder_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._local = threading.local()
+
+    # ---------- AUTH ----------
+    def credentials(self):
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request
+
+        with self._lock:
+            if self._creds is None:
+                self._creds = Credentials.from_authorized_user_info(
+                    json.loads(os.environ["GOOGLE_TOKEN"]),
+                    SCOPES
+                )
+
+            if self._needs_refresh():
+                self._creds.refresh(Request())
+
+            return self._creds
+
+    def _needs_refresh(self) -> bool:
+        creds = self._creds
+        if not creds.refresh_token:
+            return False
+        if not creds.token or creds.expiry is None:
+            return not creds.valid
+        # google-auth keeps expiry as naive UTC
+        remaining = creds.expiry - datetime.datetime.utcnow()
+        return remaining.total_seconds() < TOKEN_REFRESH_MARGIN
+
+    def service(self):
+        creds = self.credentials()
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = _build_drive(creds)
+            self._local.service = service
+        return service
+
+    def session(self):
+        from google.auth.transport.requests import AuthorizedSession
+
+        creds = self.credentials()
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = _TracedSession(AuthorizedSession(creds))
+            self._local.session = session
+        return session
+
+    # ---------- FOLDER ----------
+    def folder_id(self):
+        # Resolved under the lock: concurrent first uploads would otherwise
+        # each look the folder up, and could each create one
+        with self._folder_lock:
+            if self._folder_id is None:
+                self._folder_id = get_or_create_folder(self.service(), self.folder_name)
+            return self._folder_id
+
+    def invalidate_folder(self, stale_id: str = None):
+        """Forget the folder (only if it is still `stale_id`, when given) and its index"""
+        with self._folder_lock:
+            if stale_id is not None and self._folder_id != stale_id:
+                return
+            self._folder_id = None
+        with self._index_lock:
+            self._index = None
+
+    def _in_folder(self, action):
+        """Run `action(folder_id)`, re-resolving the folder once if it was deleted"""
+        import requests
+        from googleapiclient.errors import HttpError
+
+        folder_id = self.folder_id()
+        try:
+            return action(folder_id)
+        except (HttpError, requests.HTTPError) as e:
+            if not _is_not_found(e):
+                raise
+            print("⚠️ Drive folder missing, resolving it again")
+            self.invalidate_folder(folder_id)
+            return action(self.folder_id())
+
+    # ---------- DEDUPE INDEX ----------
+    def index(self):
+        """Files in the folder by ID, listed once and kept current by later uploads"""
+        with self._index_lock:
+            if self._index is None:
+                self._index = self._list_folder(self.folder_id())
+            return self._index
+
+    def _list_folder(self, folder_id: str):
+        files = {}
+        page_token = None
+        while True:
+            response = self.service().files().list(
+                q=f"'{folder_id}' in parents and trashed=false",
+                fields="nextPageToken, files(id, name, md5Checksum, size)",
+                pageSize=1000,
+                pageToken=page_token
+            ).execute()
+            for file in response.get("files", []):
+                files[file["id"]] = file
+
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                print(f"🗂️ Indexed {len(files)} files in Drive folder {self.folder_name}")
+                return files
+
+    def _remember(self, file: dict, name: str):
+        with self._index_lock:
+            if self._index is not None:
+                self._index[file["id"]] = {
+                    "id": file["id"],
+                    "name": name,
+                    "md5Checksum": file.get("md5Checksum"),
+                    "size": file.get("size")
+                }
+
+    def _indexed(self, name: str = None, size: int = None):
+        """Indexed files with this name and/or size"""
+        index = self.index()
+        with self._index_lock:
+            files = list(index.values())
+        return [
+            f for f in files
+            if (name is None or f.get("name") == name)
+            and (size is None or str(f.get("size")) == str(size))
+        ]
+
+    def _identical(self, filepath: str, name: str, local: TransferHash = None):
+        """An indexed file with the same bytes as `filepath`, preferring one called `name`
+
+        The local file is only hashed when some indexed file has its size.
+        """
+        candidates = self._indexed(size=os.path.getsize(filepath))
+        if not candidates:
+            return None
+
+        local = local or hash_file(filepath)
+        same = [f for f in candidates if f.get("md5Checksum") == local.hexdigest()]
+        same.sort(key=lambda f: f.get("name") != name)
+        return same[0] if same else None
+
+    def _copy(self, source: dict, name: str, label: str = ""):
+        """Server-side copy of identical bytes under a new name: no upload"""
+        def copy(folder_id):
+            return self.service().files().copy(
+                fileId=source["id"],
+                body={"name": name, "parents": [folder_id]},
+                fields="id,md5Checksum,size"
+            ).execute()
+
+        file = self._in_folder(copy)
+        self._remember(file, name)
+        print(f"{label}📑 {name} is identical to {source['name']}, copied on Drive without uploading")
+        return file["id"]
+
+    # ---------- UPLOADS ----------
+    def upload_video(self, filename, deadline=None):
+        """Resumable upload of a local file; `deadline` is checked between chunks
+
+        The file is hashed as it is read for upload and checked against the
+        md5Checksum and size Drive reports; IntegrityError on a mismatch.
+        Bytes already in the folder are not sent again.
+        """
+        from googleapiclient.http import MediaIoBaseUpload
+
+        name = os.path.basename(filename)
+        existing = self._identical(filename, name)
+        if existing and existing.get("name") == name:
+            print(f"♻️ Identical {name} already on Drive, skipping upload (ID {existing['id']})")
+            return existing["id"]
+        if existing:
+            return self._copy(existing, name)
+
+        def create(folder_id):
+            media = MediaIoBaseUpload(
+                reader,
+                mimetype="video/mp4",
+                chunksize=STREAM_CHUNK_SIZE,
+                resumable=True
+            )
+
+            file_metadata = {
+                "name": os.path.basename(filename),
+                "parents": [folder_id]
+            }
+
+            request = self.service().files().create(
+                body=file_metadata,
+                media_body=media,
+                fields="id,md5Checksum,size"
+            )
+
+            response = None
+            while response is None:
+                if deadline is not None:
+                    deadline.check(f"upload of {os.path.basename(filename)}")
+                _, response = request.next_chunk()
+            return response
+
+        reader = HashingReader(open(filename, "rb"))
+        try:
+            file = self._in_folder(create)
+        finally:
+            reader.close()
+
+        self._verify(file, reader.hash, name)
+        self._remember(file, name)
+        print("📤 Drive file ID:", file["id"])
+        return file["id"]
+
+    def _verify(self, file: dict, transferred: TransferHash, name: str, label: str = ""):
+        """Drop the Drive copy of `name` unless it matches the bytes that were sent"""
+        try:
+            verify(f"Drive copy of {name}", transferred, file.get("size"), file.get("md5Checksum"))
+        except IntegrityError:
+            print(f"{label}🗑️ Deleting mismatched Drive copy of {name} ({file['id']})")
+            try:
+                self.service().files().delete(fileId=file["id"]).execute()
+            except Exception as delete_error:
+                print(f"{label}⚠️ Could not delete {file['id']}: {delete_error}")
+            with self._index_lock:
+                if self._index is not None:
+                    self._index.pop(file["id"], None)
+            raise
+
+    def upload_file(self, filepath):
+        """Create or overwrite the same-named file, unless Drive already has these bytes"""
+        from googleapiclient.http import MediaFileUpload
+
+        filename = os.path.basename(filepath)
+        local = hash_file(filepath)
+
+        # 🔍 Check if file already exists in Drive folder
+        files = self._indexed(name=filename)
+        if files and files[0].get("md5Checksum") == local.hexdigest():
+            print(f"♻️ {filename} unchanged on Drive, skipping upload")
+            return files[0]["id"]
+
+        if not files:
+            existing = self._identical(filepath, filename, local)
+            if existing:
+                return self._copy(existing, filename)
+
+        def upsert(folder_id):
+            service = self.service()
+            media = MediaFileUpload(filepath, resumable=True)
+
+            if files:
+                # 🔁 Overwrite existing file
+                file = service.files().update(
+                    fileId=files[0]["id"],
+                    media_body=media,
+                    fields="id,md5Checksum,size"
+                ).execute()
+                print(f"🔁 Overwritten on Drive: {filename}")
+                return file
+
+            # ☁️ Upload new file
+            file_metadata = {
+                "name": filename,
+                "parents": [folder_id]
+            }
+            file = service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields="id,md5Checksum,size"
+            ).execute()
+            print(f"☁️ Uploaded to Drive: {filename}")
+            return file
+
+        file = self._in_folder(upsert)
+        self._verify(file, local, filename)
+        self._remember(file, filename)
+        return file["id"]
+
+    def stream_url(self, source_url: str, name: str, mimetype: str = "video/mp4", label: str = "",
+                   deadline=None):
+        """Pipe `source_url` into a Drive resumable upload without touching disk
+
+        At most one upload chunk (plus one read) is held in memory. Network
+        failures on either side resume from the last offset Drive confirmed.
+        `deadline` is checked before every chunk. The bytes are hashed as
+        they pass through and checked against the source's declared size
+        and Drive's md5Checksum (IntegrityError). Returns the Drive file ID.
+        """
+        import requests
+
+        session = self.session()
+
+        def open_upload(folder_id):
+            init = session.post(
+                DRIVE_UPLOAD_URL,
+                params={"uploadType": "resumable", "fields": "id,md5Checksum,size"},
+                json={"name": name, "parents": [folder_id]},
+                headers={"X-Upload-Content-Type": mimetype},
+                timeout=60
+            )
+            init.raise_for_status()
+            return init.headers["Location"]
+
+        session_uri = self._in_folder(open_upload)
+
+        print(f"{label}📡 Streaming {name} to Drive...")
+
+        offset = 0               # bytes confirmed by Drive
+        buffer = bytearray()     # bytes [offset, offset + len(buffer)) not yet confirmed
+        declared, source = _open_source(source_url, 0, deadline)
+        transferred = TransferHash()   # every source byte once, in order
+        eof = False
+        retries = 0
+
+        while True:
+            if deadline is not None:
+                deadline.check(f"stream of {name}")
+
+            while not eof and len(buffer) < STREAM_CHUNK_SIZE:
+                try:
+                    chunk = next(source)
+                    buffer.extend(chunk)
+                    transferred.update(chunk)
+                except StopIteration:
+                    eof = True
+                    # Don't finalize a truncated upload
+                    verify(f"Source of {name}", transferred, size=declared)
+                except requests.RequestException as e:
+                    retries += 1
+                    if retries > MAX_STREAM_RETRIES:
+                        raise
+                    print(f"{label}⚠️ Source stream dropped ({e}), reopening")
+                    _, source = _open_source(source_url, offset + len(buffer), deadline)
+
+            total = offset + len(buffer) if eof else None
+            body = bytes(buffer) if eof else bytes(buffer[:STREAM_CHUNK_SIZE])
+
+            if body:
+                content_range = f"bytes {offset}-{offset + len(body) - 1}/{total or '*'}"
+            else:
+                content_range = f"bytes */{total}"
+
+            try:
+                response = session.put(
+                    session_uri,
+                    data=body,
+                    headers={"Content-Range": content_range},
+                    timeout=deadline.timeout(120, f"stream of {name}") if deadline is not None else 120
+                )
+                if response.status_code in http_client.RETRYABLE_STATUS:
+                    raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+            except requests.RequestException as e:
+                retries += 1
+                if retries > MAX_STREAM_RETRIES:
+                    raise
+                print(f"{label}⚠️ Upload chunk failed ({e}), resuming")
+                time.sleep(http_client.backoff_delay(retries))
+                response = _query_status(session, session_uri, total)
+
+            if response.status_code in (200, 201):
+                break
+
+            if response.status_code != 308:
+                response.raise_for_status()
+                raise RuntimeError(f"❌ Unexpected upload status {response.status_code}")
+
+            confirmed = _confirmed_offset(response)
+            del buffer[:confirmed - offset]
+            offset = confirmed
+
+        file = response.json()
+        self._verify(file, transferred, name, label)
+        self._remember(file, name)
+        print(f"{label}📤 Drive file ID:", file["id"])
+        return file["id"]
+
+
+_default_uploader = None
+_default_lock = threading.Lock()
+
+
+def get_uploader():
+    """Process-wide DriveUploader used by the module-level helpers"""
+    global _default_uploader
+    with _default_lock:
+        if _default_uploader is None:
+            _default_uploader = DriveUploader()
+        return _default_uploader
+
+
+def get_drive_service():
+    return get_uploader().service()
+
+
+def upload_video_to_drive(filename, deadline=None):
+    return get_uploader().upload_video(filename, deadline)
+
+
+def upload_file_to_drive(filepath):
+    return get_uploader().upload_file(filepath)
+
+
+def stream_url_to_drive(source_url: str, name: str, mimetype: str = "video/mp4", label: str = "",
+                        deadline=None):
+    return get_uploader().stream_url(source_url, name, mimetype, label, deadline)
 
-    if files:
-        # 🔁 Overwrite existing file
-        file_id = files[0]["id"]
-        service.files().update(
-            fileId=file_id,
-            media_body=media
-        ).execute()
-        print(f"🔁 Overwritten on Drive: {filename}")
-    else:
-        # ☁️ Upload new file
-        file_metadata = {
-            "name": filename,
-            "parents": [folder_id]
-        }
-        service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields="id"
-        ).execute()
-        print(f"☁️ Uploaded to Drive: {filename}")
 
 
 